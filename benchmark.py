@@ -0,0 +1,406 @@
+"""
+mower定时器性能基准测试
+
+生成模拟的 runtime.log，测量日志解析、读取、冷启动和每秒刷新的耗时，
+并可以保存结果、与之前保存的结果对比以发现性能退化。
+
+    python benchmark.py generate bench_data/runtime.log --size 100
+    python benchmark.py run --size 100 --save bench_result.json
+    python benchmark.py run --size 100 --compare bench_result.json
+    python benchmark.py watch
+    python benchmark.py patterns
+"""
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+
+from log_monitor import LogMonitor
+from log_parser import DEFAULT_SCANNER, EventScanner, create_scanner, format_countdown, parse_next_mowing_time
+from log_reader import LogTailer
+
+MB = 1024 * 1024
+
+# 生成的日志默认保存的目录
+DATA_DIR = "bench_data"
+
+# 模拟 mower 日志中的普通输出
+FILLER_MESSAGES = [
+    "识别到干员 {name}",
+    "当前心情 {number}",
+    "进入基建",
+    "宿舍 {number} 换班完成",
+    "无人机数量 {number}",
+    "下一次任务：{name}",
+    "点击坐标 ({number}, {number})",
+    "截图耗时 {number} ms",
+]
+# 包含关键字但不是任务事件的输出，用于测试预过滤后的正则匹配
+NEAR_MISS_MESSAGES = [
+    "进入休息状态，关闭游戏",
+    "宿舍休息中的干员：{name}",
+    "等待跑单任务完成",
+]
+OPERATOR_NAMES = ["能天使", "德克萨斯", "阿米娅", "艾雅法拉", "银灰", "史尔特尔", "澄闪", "Lancet-2"]
+MODULES = [("solver.py", "run"), ("base_scheduler.py", "plan"), ("recognize.py", "update"),
+           ("device.py", "screencap"), ("operation.py", "tap")]
+
+
+class LogGenerator:
+    """按 mower 日志的格式生成模拟日志行"""
+
+    def __init__(self, seed=0, event_ratio=0.01, near_miss_ratio=0.02, start_time=None):
+        self.random = random.Random(seed)
+        self.event_ratio = event_ratio
+        self.near_miss_ratio = near_miss_ratio
+        self.now = start_time or datetime(2024, 1, 1, 8, 0, 0)
+        self._date = None
+        self._date_str = ""
+
+    def next_line(self):
+        """生成下一行日志，时间戳单调递增"""
+        r = self.random
+        self.now += timedelta(seconds=r.randint(0, 20))
+        # strftime 较慢，日期部分只在跨天时重新格式化
+        if self.now.date() != self._date:
+            self._date = self.now.date()
+            self._date_str = self._date.isoformat()
+        now = self.now
+        prefix = (f"{self._date_str} {now.hour:02d}:{now.minute:02d}:{now.second:02d},"
+                  f"{r.randint(0, 999):03d} INFO ")
+        module, func = r.choice(MODULES)
+        return f"{prefix}{module}:{r.randint(1, 999)} {func}: {self.next_message()}\n"
+
+    def next_message(self):
+        r = self.random
+        roll = r.random()
+        if roll >= self.event_ratio:
+            if roll < self.event_ratio + self.near_miss_ratio:
+                template = r.choice(NEAR_MISS_MESSAGES)
+            else:
+                template = r.choice(FILLER_MESSAGES)
+            return template.format(name=r.choice(OPERATOR_NAMES), number=r.randint(0, 500))
+
+        kind = r.random()
+        if kind < 0.4:
+            hours, minutes = r.randint(1, 5), r.randint(0, 59)
+            target = (self.now + timedelta(hours=hours, minutes=minutes)).strftime("%H:%M:%S")
+            return f"休息 {hours} 小时 {minutes} 分钟，到{target}开始工作"
+        if kind < 0.8:
+            minutes = r.randint(1, 59)
+            target = (self.now + timedelta(minutes=minutes)).strftime("%H:%M:%S")
+            return f"休息 {minutes} 分钟，到{target}开始工作"
+        return f"等待跑单 {r.uniform(1, 600):.1f} 秒"
+
+    def write(self, f, size):
+        """写入至少 size 字节的日志行"""
+        written = 0
+        block = []
+        block_size = 0
+        while written < size:
+            line = self.next_line().encode("utf-8")
+            block.append(line)
+            block_size += len(line)
+            if block_size >= MB:
+                f.write(b"".join(block))
+                written += block_size
+                block, block_size = [], 0
+                if written >= size:
+                    break
+        if block:
+            f.write(b"".join(block))
+            written += block_size
+        return written
+
+
+def generate_log(path, size, seed=0, event_ratio=0.01, near_miss_ratio=0.02):
+    """生成大小约为 size 字节的模拟日志文件"""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "wb") as f:
+        LogGenerator(seed, event_ratio, near_miss_ratio).write(f, size)
+
+
+def best_of(func, repeat):
+    """运行多次，返回最短耗时（秒）和最后一次的返回值"""
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def bench_parse(path, repeat):
+    """parse_next_mowing_time 解析整个日志内容的吞吐量"""
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        content = f.read()
+    elapsed, _ = best_of(lambda: parse_next_mowing_time(content), repeat)
+    return {"parse_mb_per_s": os.path.getsize(path) / MB / elapsed}
+
+
+def bench_full_read(path, repeat):
+    """从头读取并解析整个日志文件（相当于日志轮转后的重新扫描）的吞吐量"""
+    def read_all():
+        content, _ = LogTailer(path).read_new()
+        return DEFAULT_SCANNER.latest(content)
+
+    elapsed, _ = best_of(read_all, repeat)
+    return {"full_read_mb_per_s": os.path.getsize(path) / MB / elapsed}
+
+
+def bench_cold_start(path, repeat):
+    """冷启动：从文件末尾向前找到最新任务事件的耗时"""
+    elapsed, _ = best_of(lambda: LogTailer(path).find_latest_event(DEFAULT_SCANNER), repeat)
+    return {"cold_start_ms": elapsed * 1000}
+
+
+def bench_incremental(path, repeat, lines_per_refresh=20):
+    """
+    增量刷新：向日志追加若干行后读取新内容并解析的耗时
+    测试结束后把日志截断回原来的大小
+    """
+    original_size = os.path.getsize(path)
+    generator = LogGenerator(seed=1, event_ratio=0.05, start_time=datetime(2030, 1, 1))
+    tailer = LogTailer(path)
+    tailer.find_latest_event(DEFAULT_SCANNER)
+    timings = []
+    try:
+        for _ in range(max(repeat, 10)):
+            with open(path, "ab") as f:
+                f.write("".join(generator.next_line() for _ in range(lines_per_refresh)).encode("utf-8"))
+            start = time.perf_counter()
+            content, _ = tailer.read_new()
+            DEFAULT_SCANNER.latest(content)
+            timings.append(time.perf_counter() - start)
+    finally:
+        os.truncate(path, original_size)
+    timings.sort()
+    return {"incremental_refresh_ms": timings[len(timings) // 2] * 1000}
+
+
+def bench_tick(path, ticks=10000):
+    """每秒刷新时界面之外的开销：取出状态队列并生成倒计时文本（CPU时间）"""
+    event = LogTailer(path).find_latest_event(DEFAULT_SCANNER)
+    if event is not None:
+        # 让倒计时处于进行中，覆盖完整的格式化路径
+        event = event._replace(target_time=datetime.now() + timedelta(hours=1))
+    state_queue = queue.Queue()
+    start = time.process_time()
+    for _ in range(ticks):
+        state_queue.put(event)
+        try:
+            while True:
+                current = state_queue.get_nowait()
+        except queue.Empty:
+            pass
+        format_countdown(current)
+    return {"tick_cpu_us": (time.process_time() - start) / ticks * 1e6}
+
+
+def bench_watch(directory=DATA_DIR, writes=20, interval=0.05):
+    """
+    用模拟的日志写入者测试日志监视：每次追加几行普通输出和一条等待跑单，
+    目标时间交替变晚、变早，测量从写入到订阅者收到新事件的延迟，
+    并检查收到的总是最新写入的一条（目标时间更早的新安排也必须立即生效）
+    """
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, "watch_runtime.log")
+    generator = LogGenerator(seed=2, event_ratio=0, near_miss_ratio=0.5)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(generator.next_line())
+
+    updates = queue.Queue()
+    monitor = LogMonitor()
+    monitor.subscribe(path, updates.put)
+    monitor.start()
+    latencies = []
+    try:
+        # 首次读取时日志中还没有任务事件
+        updates.get(timeout=5)
+        for i in range(writes):
+            now = datetime.now().replace(microsecond=0)
+            seconds = 3600 + i if i % 2 == 0 else 60 + i
+            filler = "".join(generator.next_line() for _ in range(5))
+            line = f"{now:%Y-%m-%d %H:%M:%S},000 INFO solver.py:1 run: 等待跑单 {seconds}.0 秒\n"
+            start = time.perf_counter()
+            with open(path, "a", encoding="utf-8") as f:
+                f.write(filler + line)
+            try:
+                event = updates.get(timeout=5)
+            except queue.Empty:
+                raise RuntimeError(f"第 {i + 1} 次写入后 5 秒内没有收到新事件")
+            latencies.append(time.perf_counter() - start)
+            if event is None or event.target_time != now + timedelta(seconds=seconds):
+                raise RuntimeError(f"第 {i + 1} 次写入后收到的不是最新的事件: {event}")
+            time.sleep(interval)
+    finally:
+        monitor.stop()
+        os.remove(path)
+    latencies.sort()
+    return {"watch_latency_ms": latencies[len(latencies) // 2] * 1000}
+
+
+# 无法合并或无法预筛选的事件格式，配置后必须回退到默认格式
+# (格式, marker)：无法合并或无法预筛选的事件格式，配置后必须回退到默认格式
+INVALID_PATTERNS = [
+    (r"(?i)休息 到(?P<hour>\d{2}):(?P<minute>\d{2})", "休息"),
+    (r"休息 (\d+) 分钟 \1 到(?P<hour>\d{2}):(?P<minute>\d{2})", None),
+    (r"休息 (小时 )?(?(1)\d+|\d+) 分钟，到(?P<hour>\d{2}):(?P<minute>\d{2})", None),
+    # 最外层有 | 时开头的文字只属于第一个分支，必须指定 marker
+    (r"休息 到(?P<hour>\d{2}):(?P<minute>\d{2})|睡觉 到(?P<hour2>\d{2}):(?P<minute2>\d{2})", None),
+    (r"休息 (到(?P<hour>\d{2}):(?P<minute>\d{2})", None),
+]
+
+
+def check_patterns():
+    """检查有误的 event_patterns 配置回退到默认格式，可以合并的写法（命名条件分组、局部标志）仍然可用"""
+    for pattern, marker in INVALID_PATTERNS:
+        config = {"event_patterns": [{"kind": "rest", "pattern": pattern, "target": "at", "marker": marker}]}
+        if create_scanner(config) is not DEFAULT_SCANNER:
+            raise RuntimeError(f"事件格式 {pattern} 有误，但没有回退到默认格式")
+
+    scanner = EventScanner([
+        {"kind": "rest", "target": "at", "marker": "until",
+         "pattern": r"(?i:rest) (?P<long>long )?(?(long)\d+ h |)until (?P<hour>\d{2}):(?P<minute>\d{2})"},
+        {"kind": "wait_order", "target": "after", "marker": "秒",
+         "pattern": r"等待跑单 (?P<seconds>\d+) 秒|跑单倒计时 (?P<minutes>\d+) 分 (?P<seconds2>\d+) 秒"},
+    ])
+    timestamp = datetime(2024, 1, 1, 10, 0, 0)
+    text = (f"{timestamp:%Y-%m-%d %H:%M:%S},000 INFO a.py:1 run: REST long 2 h until 12:30\n"
+            f"{timestamp:%Y-%m-%d %H:%M:%S},000 INFO a.py:1 run: 跑单倒计时 3 分 5 秒\n")
+    events = list(scanner.scan(text))
+    expected = [timestamp.replace(hour=12, minute=30), timestamp + timedelta(minutes=3)]
+    if [event.target_time for event in events] != expected:
+        raise RuntimeError(f"合并后的事件格式解析结果有误: {events}")
+
+
+# 指标名称、显示名称、数值越大越好
+METRICS = [
+    ("parse_mb_per_s", "解析吞吐量 (MB/s)", True),
+    ("full_read_mb_per_s", "完整读取吞吐量 (MB/s)", True),
+    ("cold_start_ms", "冷启动耗时 (ms)", False),
+    ("incremental_refresh_ms", "增量刷新耗时 (ms)", False),
+    ("tick_cpu_us", "每次刷新CPU时间 (us)", False),
+    ("watch_latency_ms", "日志变化响应延迟 (ms)", False),
+]
+
+
+def run_benchmarks(path, repeat, incremental=True):
+    results = {}
+    results.update(bench_parse(path, repeat))
+    results.update(bench_full_read(path, repeat))
+    results.update(bench_cold_start(path, repeat))
+    if incremental:
+        results.update(bench_incremental(path, repeat))
+    results.update(bench_tick(path))
+    results.update(bench_watch())
+    return results
+
+
+def format_results(results, baseline=None, threshold=0.1):
+    """
+    生成结果表格，有基准结果时显示变化比例
+    返回 (文本, 是否有指标退化超过 threshold)
+    """
+    lines = []
+    regressed = False
+    for key, title, higher_is_better in METRICS:
+        if key not in results:
+            continue
+        line = f"{title:<24}{results[key]:>12.2f}"
+        if baseline and key in baseline:
+            change = (results[key] - baseline[key]) / baseline[key] if baseline[key] else 0.0
+            worse = -change if higher_is_better else change
+            line += f"  {baseline[key]:>12.2f}  {change:+7.1%}"
+            if worse > threshold:
+                line += "  退化"
+                regressed = True
+        lines.append(line)
+    return "\n".join(lines), regressed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="mower定时器性能基准测试")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    generate_parser = subparsers.add_parser("generate", help="生成模拟日志")
+    generate_parser.add_argument("path", help="输出的日志文件路径")
+    generate_parser.add_argument("--size", type=float, default=100, help="日志大小（MB），默认100")
+    generate_parser.add_argument("--seed", type=int, default=0, help="随机种子")
+    generate_parser.add_argument("--event-ratio", type=float, default=0.01,
+                                 help="任务事件行所占比例，默认0.01")
+    generate_parser.add_argument("--near-miss-ratio", type=float, default=0.02,
+                                 help="包含关键字但不是任务事件的行所占比例，默认0.02")
+
+    run_parser = subparsers.add_parser("run", help="运行基准测试")
+    run_parser.add_argument("--log", help="使用已有的日志文件（不会测试增量刷新，不会修改该文件）")
+    run_parser.add_argument("--size", type=float, default=100,
+                            help="没有指定 --log 时生成的日志大小（MB），默认100")
+    run_parser.add_argument("--repeat", type=int, default=3, help="每项测试重复次数，取最好成绩")
+    run_parser.add_argument("--save", help="把结果保存为JSON文件")
+    run_parser.add_argument("--compare", help="与之前保存的JSON结果对比")
+    run_parser.add_argument("--threshold", type=float, default=0.1,
+                            help="变差超过该比例时标记为退化，默认0.1")
+
+    subparsers.add_parser("watch", help="用模拟的日志写入者测试日志监视的响应延迟和结果")
+    subparsers.add_parser("patterns", help="检查有误的事件格式配置回退到默认格式")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "watch":
+        text, _ = format_results(bench_watch())
+        print(text)
+        return 0
+
+    if args.command == "patterns":
+        check_patterns()
+        print("事件格式检查通过")
+        return 0
+
+    if args.command == "generate":
+        generate_log(args.path, int(args.size * MB), args.seed, args.event_ratio, args.near_miss_ratio)
+        print(f"已生成 {args.path} ({os.path.getsize(args.path) / MB:.1f} MB)")
+        return 0
+
+    if args.log:
+        path = args.log
+    else:
+        # 同样大小的模拟日志只生成一次
+        path = os.path.join(DATA_DIR, f"runtime_{args.size:g}MB.log")
+        if not os.path.exists(path):
+            print(f"正在生成 {path} ...")
+            generate_log(path, int(args.size * MB))
+
+    results = run_benchmarks(path, args.repeat, incremental=not args.log)
+    baseline = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+
+    print(f"日志: {path} ({os.path.getsize(path) / MB:.1f} MB)")
+    text, regressed = format_results(results, baseline, args.threshold)
+    print(text)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({
+                "log_size_mb": os.path.getsize(path) / MB,
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "results": results,
+            }, f, indent=4, ensure_ascii=False)
+
+    return 1 if regressed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import json
+import os
+import sys
+import threading
+
+
+def get_config_path():
+    """获取配置文件路径"""
+    try:
+        # PyInstaller环境下
+        base_path = sys._MEIPASS
+        # 在打包环境中，配置文件应该在可执行文件同级目录
+        config_path = os.path.join(os.path.dirname(sys.executable), "config.json")
+        if os.path.exists(config_path):
+            return config_path
+    except Exception:
+        pass
+    
+    # 开发环境或配置文件在当前目录
+    return "config.json"
+
+
+def get_config_dir():
+    """获取配置文件所在目录，缓存等文件保存在这里"""
+    return os.path.dirname(os.path.abspath(get_config_path()))
+
+
+# 默认配置
+DEFAULT_CONFIG = {
+    "log_file_path": r".\runtime.log",
+    "font_name": "Microsoft YaHei",
+    "font_size": 24,
+    "background_color": "#80ff80",
+    "font_color": "#000000",
+    "remark_font_size": 20,
+    "remark_color": "#0000ff",
+    "window_width": 550,
+    "window_height": 60,
+    "window_x": 1000,
+    "window_y": 1000,
+    "window_alpha": 1.0,
+    "remark": "账号1",
+    # 本地状态服务的端口，0 表示不启动
+    "status_port": 0,
+    # 允许跨域读取本地状态服务的网页来源，例如 "http://localhost:3000"，默认不允许
+    "status_allowed_origins": []
+}
+
+CONFIG_FILE = "config.json"
+
+# 多账号时每个账号单独保存的配置项，其余配置项所有账号共用
+ACCOUNT_KEYS = ("log_file_path", "remark", "window_x", "window_y")
+
+# 配置修改后等待多少秒没有新的修改再写入文件
+SAVE_DELAY = 1.0
+
+
+def load_config():
+    """加载配置文件，如果不存在则创建默认配置"""
+    config_file = get_config_path()
+    default_config = DEFAULT_CONFIG.copy()
+
+    if os.path.exists(config_file):
+        try:
+            with open(config_file, 'r', encoding='utf-8') as f:
+                config = json.load(f)
+                # 合并默认配置和文件配置，确保新字段存在
+                default_config.update(config)
+                return default_config
+        except Exception as e:
+            print(f"读取配置文件出错: {e}")
+            return default_config
+    else:
+        # 如果配置文件不存在，创建默认配置文件
+        save_config(default_config)
+        return default_config
+
+
+def save_config(config, config_file=None):
+    """保存配置到文件，先写临时文件再替换，避免写到一半时损坏配置文件"""
+    config_file = config_file or get_config_path()
+    temp_file = config_file + ".tmp"
+    with open(temp_file, 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=4, ensure_ascii=False)
+    os.replace(temp_file, config_file)
+
+
+def get_account_config(config, account_index):
+    """
+    合并共用配置和指定账号的配置
+    config.json 中的 accounts 列表每一项可以覆盖任意配置项，
+    没有设置窗口位置的账号依次排列在第一个窗口下方
+    """
+    accounts = config.get('accounts') or []
+    if account_index is None or account_index >= len(accounts):
+        return config
+    
+    account = accounts[account_index]
+    merged = dict(config)
+    merged.update(account)
+    if 'window_y' not in account:
+        merged['window_y'] = config['window_y'] + account_index * config['window_height']
+    return merged
+
+
+def get_accounts(config):
+    """返回每个账号合并后的配置列表，没有配置多账号时只有一项"""
+    accounts = config.get('accounts') or []
+    if not accounts:
+        return [config]
+    return [get_account_config(config, index) for index in range(len(accounts))]
+
+
+class ConfigStore:
+    """
+    程序中所有窗口共用的内存配置
+    修改配置时只通知发生变化的配置项；写入文件推迟到一段时间内没有新的修改之后，
+    连续修改（例如拖动数值框）只写入一次
+    """
+
+    def __init__(self, config_file=None):
+        self.config_file = config_file or get_config_path()
+        # 确认过的配置，写入文件的只有这些
+        self.data = load_config()
+        # 只用于预览、没有确认保存的修改：账号序号（None 表示共用配置）-> {配置项: 值}
+        # get() 合并在确认过的配置之上，不会写入文件
+        self.previews = {}
+        self.listeners = []
+        # 有没有写入文件的修改
+        self.dirty = False
+        self._lock = threading.Lock()
+        self._save_timer = None
+
+    def merged_data(self):
+        """确认过的配置加上预览的修改，调用时需要持有锁"""
+        if not self.previews:
+            return self.data
+        data = dict(self.data)
+        data.update(self.previews.get(None, {}))
+        accounts = self.data.get('accounts')
+        if accounts:
+            data['accounts'] = [dict(account, **self.previews.get(index, {}))
+                                for index, account in enumerate(accounts)]
+        return data
+
+    def get(self, account_index=None):
+        """返回账号合并后的配置副本（包括预览的修改），account_index 为 None 时返回共用配置"""
+        with self._lock:
+            return dict(get_account_config(self.merged_data(), account_index))
+
+    def subscribe(self, callback):
+        """callback(account_index, keys) 在配置变化后调用，account_index 为 None 表示修改的是共用配置"""
+        self.listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def update(self, values, account_index=None, persist=True):
+        """
+        修改配置，多账号时账号单独保存的配置项（以及账号自己覆盖了的配置项）保存到该账号中
+        persist 为 False 时只作为预览，不修改确认过的配置，也不会写入文件；
+        persist 为 True 时写入确认过的配置，并取代这些配置项的预览
+        """
+        changed = set()
+        shared_changed = False
+        with self._lock:
+            accounts = self.data.get('accounts') or []
+            account = None
+            if account_index is not None and account_index < len(accounts):
+                account = accounts[account_index]
+            for key, value in values.items():
+                target, owner = self.data, None
+                if account is not None and (key in ACCOUNT_KEYS or key in account):
+                    target, owner = account, account_index
+                preview = self.previews.setdefault(owner, {})
+                current = preview.get(key, target.get(key))
+                if persist:
+                    preview.pop(key, None)
+                    if target.get(key) != value:
+                        target[key] = value
+                        self.dirty = True
+                elif target.get(key) != value:
+                    preview[key] = value
+                else:
+                    preview.pop(key, None)
+                if current != value:
+                    changed.add(key)
+                    shared_changed = shared_changed or owner is None
+            self.previews = {owner: preview for owner, preview in self.previews.items() if preview}
+            dirty = self.dirty
+
+        if persist and dirty:
+            self.schedule_save()
+        self.notify(account_index, changed, shared_changed)
+
+    def discard_preview(self, keys, account_index=None):
+        """撤销这些配置项的预览，恢复为确认过的配置"""
+        changed = set()
+        shared_changed = False
+        with self._lock:
+            for owner in (None, account_index):
+                preview = self.previews.get(owner)
+                for key in keys:
+                    if preview and key in preview:
+                        del preview[key]
+                        changed.add(key)
+                        shared_changed = shared_changed or owner is None
+            self.previews = {owner: preview for owner, preview in self.previews.items() if preview}
+        self.notify(account_index, changed, shared_changed)
+
+    def notify(self, account_index, changed, shared_changed):
+        if changed:
+            for callback in list(self.listeners):
+                callback(None if shared_changed else account_index, changed)
+
+    def schedule_save(self):
+        """推迟写入文件，期间再次修改会重新计时"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+            self._save_timer = threading.Timer(SAVE_DELAY, self.save)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+
+    def save(self):
+        """把有修改的配置写入文件"""
+        with self._lock:
+            self._save_timer = None
+            if not self.dirty:
+                return
+            # 在锁内复制一份，写文件时不阻塞界面线程修改配置
+            data = json.loads(json.dumps(self.data))
+            self.dirty = False
+        try:
+            save_config(data, self.config_file)
+        except OSError as e:
+            print(f"保存配置文件出错: {e}")
+            with self._lock:
+                self.dirty = True
+
+    def flush(self):
+        """取消推迟的写入并立即保存，退出前调用"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+        self.save()
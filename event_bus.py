@@ -0,0 +1,182 @@
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import subprocess
+import sys
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from headless import account_state
+from log_parser import EVENT_REST, EVENT_WAIT_ORDER
+
+try:
+    import winsound
+except ImportError:
+    winsound = None
+
+# 执行提醒动作的线程数，提醒再慢也不会占用日志监视和倒计时刷新
+HOOK_WORKERS = 2
+
+# 命令和 POST 请求的超时时间（秒）
+HOOK_TIMEOUT = 30
+
+# 提醒动作
+ACTION_SOUND = "sound"      # 播放声音，可以用 file 指定 wav 文件
+ACTION_COMMAND = "command"  # 执行本地命令，事件信息通过环境变量传入
+ACTION_POST = "post"        # 把账号状态以 JSON POST 到 url
+
+
+def play_sound(rule, account, event):
+    if winsound is None:
+        # 非 Windows 平台只能让终端响铃
+        if sys.stdout is not None:
+            sys.stdout.write("\a")
+            sys.stdout.flush()
+        return
+    if rule.get("file"):
+        winsound.PlaySound(rule["file"], winsound.SND_FILENAME)
+    else:
+        winsound.MessageBeep()
+
+
+def run_command(rule, account, event):
+    env = dict(os.environ,
+               MOWER_REMARK=str(account['remark']),
+               MOWER_EVENT_KIND=event.kind,
+               MOWER_TARGET_TIME=event.target_time.isoformat(),
+               MOWER_MINUTES_BEFORE=str(rule.get("minutes_before", 0)))
+    subprocess.run(rule["command"], shell=True, env=env, timeout=HOOK_TIMEOUT)
+
+
+def post_state(rule, account, event):
+    data = account_state(account, event)
+    data["minutes_before"] = rule.get("minutes_before", 0)
+    request = urllib.request.Request(rule["url"], data=json.dumps(data, ensure_ascii=False).encode('utf-8'),
+                                     headers={"Content-Type": "application/json; charset=utf-8"})
+    with urllib.request.urlopen(request, timeout=HOOK_TIMEOUT):
+        pass
+
+
+ACTIONS = {
+    ACTION_SOUND: play_sound,
+    ACTION_COMMAND: run_command,
+    ACTION_POST: post_state,
+}
+
+# 各动作必须配置的参数
+REQUIRED_KEYS = {
+    ACTION_SOUND: (),
+    ACTION_COMMAND: ("command",),
+    ACTION_POST: ("url",),
+}
+
+
+def load_rules(account):
+    """读取账号配置中的 notifications，忽略有误的项"""
+    rules = []
+    for rule in account.get('notifications') or []:
+        try:
+            action = rule["action"]
+            missing = [key for key in REQUIRED_KEYS[action] if not rule.get(key)]
+            float(rule.get("minutes_before", 0))
+            if rule.get("event") not in (None, EVENT_REST, EVENT_WAIT_ORDER):
+                raise ValueError(rule["event"])
+        except (KeyError, TypeError, ValueError):
+            print(f"提醒配置有误，已忽略: {rule}")
+            continue
+        if missing:
+            print(f"提醒配置缺少 {'、'.join(missing)}，已忽略: {rule}")
+            continue
+        rules.append(rule)
+    return rules
+
+
+class EventBus:
+    """
+    在任务事件的目标时间之前（或到达时）触发提醒
+    所有提醒时间保存在一个堆中，由一个定时等待到最早的提醒时间；
+    日志监视器通知新的任务事件时，这个日志之前安排的提醒全部作废，按新事件重新安排
+    提醒动作在有限的线程池中执行，不会阻塞事件循环
+    通过 LogMonitor.add_service(bus.serve) 与日志监视运行在同一个事件循环中
+
+    notifications 配置的每一项：
+        event           触发的事件类型（rest 或 wait_order），不填表示两种都触发
+        minutes_before  提前多少分钟提醒，0 表示到达目标时间时（例如跑单结束）
+        action          sound、command 或 post
+    """
+
+    def __init__(self, monitor, accounts, workers=HOOK_WORKERS):
+        self.monitor = monitor
+        # 日志路径 -> [(账号, 提醒规则)]
+        self.rules = {}
+        for account in accounts:
+            for rule in load_rules(account):
+                self.rules.setdefault(account['log_file_path'], []).append((account, rule))
+        self.workers = workers
+        # (提醒时间, 序号, 日志路径, 安排时的代数, 账号, 规则, 事件)
+        self.heap = []
+        self._counter = itertools.count()
+        # 日志路径 -> 代数，每次重新安排时加一，之前安排的提醒随之作废
+        self.generations = {}
+        self.events = {}
+        self._changed = None
+        self._executor = None
+
+    async def serve(self):
+        """运行直到被取消"""
+        self._changed = asyncio.Event()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        callbacks = {path: (lambda event, path=path: self.update(path, event)) for path in self.rules}
+        for path, callback in callbacks.items():
+            self.monitor.subscribe(path, callback)
+        try:
+            while True:
+                self.fire_due()
+                timeout = None
+                if self.heap:
+                    timeout = max(0.0, (self.heap[0][0] - datetime.now()).total_seconds())
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                self._changed.clear()
+        finally:
+            for path, callback in callbacks.items():
+                self.monitor.unsubscribe(path, callback)
+            self._executor.shutdown(wait=False)
+
+    def update(self, path, event):
+        """日志的任务事件变化时重新安排这个日志的提醒"""
+        if self.events.get(path) == event:
+            return
+        self.events[path] = event
+        generation = self.generations[path] = self.generations.get(path, 0) + 1
+        if event is not None:
+            now = datetime.now()
+            for account, rule in self.rules.get(path, ()):
+                if rule.get("event") not in (None, event.kind):
+                    continue
+                due = event.target_time - timedelta(minutes=float(rule.get("minutes_before", 0)))
+                # 已经过了的提醒不再触发
+                if due > now:
+                    heapq.heappush(self.heap, (due, next(self._counter), path, generation, account, rule, event))
+        self._changed.set()
+
+    def fire_due(self):
+        """触发所有已到时间的提醒，丢弃已作废的提醒"""
+        now = datetime.now()
+        while self.heap and self.heap[0][0] <= now:
+            _, _, path, generation, account, rule, event = heapq.heappop(self.heap)
+            if generation != self.generations.get(path):
+                continue
+            self._executor.submit(self.run_hook, account, rule, event)
+
+    def run_hook(self, account, rule, event):
+        """在线程池中执行提醒动作，出错时只输出错误"""
+        try:
+            ACTIONS[rule["action"]](rule, account, event)
+        except Exception as e:
+            print(f"执行提醒 {rule['action']} 出错: {e}")
@@ -0,0 +1,123 @@
+import json
+import os
+import queue
+import sys
+import threading
+from tkinter import font
+
+# 保存在配置文件旁边的字体列表缓存文件名
+FONT_CACHE_FILE = "font_cache.json"
+
+# 字体列表加载完成前使用的字体
+DEFAULT_FONTS = ["Microsoft YaHei", "SimSun", "SimHei", "KaiTi", "FangSong"]
+
+# 等待后台线程读取缓存时的检查间隔（毫秒）
+POLL_INTERVAL = 50
+
+
+def font_dirs():
+    """系统和当前用户的字体目录"""
+    if sys.platform == 'win32':
+        return [os.path.join(os.environ.get('WINDIR', r'C:\Windows'), 'Fonts'),
+                os.path.join(os.environ.get('LOCALAPPDATA', ''), 'Microsoft', 'Windows', 'Fonts')]
+    if sys.platform == 'darwin':
+        return ['/System/Library/Fonts', '/Library/Fonts', os.path.expanduser('~/Library/Fonts')]
+    return ['/usr/share/fonts', '/usr/local/share/fonts',
+            os.path.expanduser('~/.local/share/fonts'), os.path.expanduser('~/.fonts')]
+
+
+def font_dirs_key():
+    """各字体目录的修改时间，安装或删除字体后会变化"""
+    key = {}
+    for path in font_dirs():
+        try:
+            key[path] = os.stat(path).st_mtime
+        except OSError:
+            pass
+    return key
+
+
+class FontList:
+    """
+    系统已安装的字体列表，供设置窗口的字体下拉框使用
+    启动后在后台线程读取缓存，字体目录的修改时间没有变化时直接使用缓存；
+    否则在界面空闲时枚举一次（tkinter 只能在主线程中调用），再由后台线程写入缓存
+    打开设置窗口时不需要等待枚举
+    """
+
+    def __init__(self, root, cache_path):
+        self.root = root
+        self.cache_path = cache_path
+        # 加载完成前为 None
+        self.families = None
+        self.listeners = []
+        self._key = None
+        self._loaded = queue.Queue()
+
+    def start(self):
+        """开始加载字体列表，只需要调用一次"""
+        threading.Thread(target=self.read_cache, daemon=True).start()
+        self.root.after(POLL_INTERVAL, self.wait_cache)
+
+    def subscribe(self, callback):
+        """callback(families) 在字体列表加载完成后在主线程中调用，已经加载完成时立即调用"""
+        if self.families is not None:
+            callback(self.families)
+        else:
+            self.listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def read_cache(self):
+        """后台线程：计算字体目录的修改时间并读取缓存，缓存无效时返回 None"""
+        key = font_dirs_key()
+        families = None
+        try:
+            with open(self.cache_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("key") == key and data.get("families"):
+                families = data["families"]
+        except (OSError, ValueError, AttributeError):
+            pass
+        self._loaded.put((key, families))
+
+    def wait_cache(self):
+        """主线程：等待后台线程读取缓存，缓存无效时在空闲时枚举字体"""
+        try:
+            self._key, families = self._loaded.get_nowait()
+        except queue.Empty:
+            self.root.after(POLL_INTERVAL, self.wait_cache)
+            return
+        if families is None:
+            self.root.after_idle(self.enumerate)
+        else:
+            self.set_families(families)
+
+    def enumerate(self):
+        """枚举系统字体，忽略 Windows 上用于竖排的 @ 开头的字体"""
+        try:
+            families = sorted({name for name in font.families(self.root) if not name.startswith('@')},
+                              key=str.lower)
+        except Exception as e:
+            print(f"读取系统字体出错: {e}")
+            return
+        self.set_families(families)
+        threading.Thread(target=self.save_cache, args=(self._key, families), daemon=True).start()
+
+    def save_cache(self, key, families):
+        """后台线程：写入缓存，先写临时文件再替换"""
+        temp_path = self.cache_path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"key": key, "families": families}, f, ensure_ascii=False)
+            os.replace(temp_path, self.cache_path)
+        except OSError as e:
+            print(f"保存字体列表出错: {e}")
+
+    def set_families(self, families):
+        self.families = families
+        listeners, self.listeners = self.listeners, []
+        for callback in listeners:
+            callback(families)
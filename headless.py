@@ -0,0 +1,173 @@
+import json
+import os
+import queue
+import sys
+import time
+from datetime import date, datetime
+
+import profiling
+import startup_report
+from config_store import get_accounts, get_config_dir, load_config
+from log_monitor import LogMonitor
+from log_parser import DEFAULT_SCANNER, create_scanner, format_countdown
+from log_reader import LogTailer, find_latest_rotated_event
+from schedule_history import HISTORY_FILE, ScheduleHistory
+from state_cache import STATE_CACHE_FILE, StateCache
+
+# --stats 输出最近几次休息的时长
+STATS_REST_COUNT = 5
+
+
+def read_latest_event(log_file_path, scanner=DEFAULT_SCANNER):
+    """
+    直接从日志末尾向前查找最新的任务事件，用于只输出一次的情况
+    当前日志中没有任务事件时（例如刚刚轮转）从轮转产生的旧日志中查找
+    """
+    try:
+        if os.path.exists(log_file_path):
+            event = LogTailer(log_file_path).find_latest_event(scanner)
+            if event is not None:
+                return event
+        return find_latest_rotated_event(log_file_path, scanner)
+    except Exception:
+        return None
+
+
+def account_state(account, event, now=None):
+    """一个账号的状态：事件类型、目标时间、剩余秒数和倒计时文本"""
+    now = now or datetime.now()
+    state = {
+        "remark": account['remark'],
+        "log_file_path": account['log_file_path'],
+        "kind": None,
+        "timestamp": None,
+        "target_time": None,
+        "remaining_seconds": None,
+        "text": format_countdown(event, now),
+    }
+    if event is not None:
+        state.update(
+            kind=event.kind,
+            timestamp=event.timestamp.isoformat(),
+            target_time=event.target_time.isoformat(),
+            remaining_seconds=max(0, int((event.target_time - now).total_seconds())),
+        )
+    return state
+
+
+def format_state(account, event, as_json, now=None):
+    """生成一个账号的输出行"""
+    now = now or datetime.now()
+    if not as_json:
+        return format_countdown(event, now)
+    return json.dumps(account_state(account, event, now), ensure_ascii=False)
+
+
+def write_states(accounts, events, as_json):
+    """输出所有账号的当前状态，多账号的纯文本输出在行首加上备注"""
+    now = datetime.now()
+    lines = []
+    for account in accounts:
+        line = format_state(account, events.get(account['log_file_path']), as_json, now)
+        if not as_json and len(accounts) > 1:
+            line = f"{account['remark']} {line}"
+        lines.append(line)
+    sys.stdout.write("\n".join(lines) + "\n")
+    sys.stdout.flush()
+
+
+def write_stats(accounts, history, as_json, scanner=DEFAULT_SCANNER):
+    """补建任务历史索引后，输出每个账号今天的工作时间占比和最近几次休息的时长"""
+    for log_file_path in {account['log_file_path'] for account in accounts}:
+        while not history.backfill(log_file_path, scanner):
+            pass
+    history.save(force=True)
+
+    today = date.today()
+    for account in accounts:
+        share = history.working_share(today, account['log_file_path'])
+        rests = history.rest_durations(STATS_REST_COUNT, account['log_file_path'])
+        if as_json:
+            line = json.dumps({
+                "remark": account['remark'],
+                "log_file_path": account['log_file_path'],
+                "working_share": share,
+                "rests": [{"start": start.isoformat(), "seconds": duration.total_seconds()}
+                          for start, duration in rests],
+            }, ensure_ascii=False)
+        else:
+            share_text = "无记录" if share is None else f"{share:.1%}"
+            rest_text = "、".join(str(duration) for _, duration in rests) or "无记录"
+            line = f"今日工作时间占比 {share_text}，最近休息时长 {rest_text}"
+            if len(accounts) > 1:
+                line = f"{account['remark']} {line}"
+        print(line)
+
+
+def report_startup():
+    """第一次输出后写入启动耗时报告"""
+    startup_report.mark("首次输出")
+    startup_report.write_report(get_config_dir())
+
+
+def run(args):
+    """无界面模式：把倒计时输出到标准输出，只输出一次或持续输出"""
+    config = load_config()
+    accounts = get_accounts(config)
+    scanner = create_scanner(config)
+    history = ScheduleHistory(os.path.join(get_config_dir(), HISTORY_FILE))
+
+    try:
+        if args.stats:
+            write_stats(accounts, history, args.json, scanner)
+            return
+
+        if args.once:
+            events = {account['log_file_path']: read_latest_event(account['log_file_path'], scanner)
+                      for account in accounts}
+            write_states(accounts, events, args.json)
+            report_startup()
+            return
+
+        # 持续输出时由日志监视器在后台线程中增量读取
+        monitor = LogMonitor(scanner,
+                             state_cache=StateCache(os.path.join(get_config_dir(), STATE_CACHE_FILE)),
+                             history=history)
+        updates = queue.Queue()
+        for log_file_path in {account['log_file_path'] for account in accounts}:
+            monitor.subscribe(log_file_path, lambda event, path=log_file_path: updates.put((path, event)))
+        if config.get('status_port'):
+            from status_server import StatusServer
+            monitor.add_service(StatusServer(monitor, accounts, config['status_port'],
+                                             allowed_origins=config.get('status_allowed_origins')).serve)
+        if any(account.get('notifications') for account in accounts):
+            from event_bus import EventBus
+            monitor.add_service(EventBus(monitor, accounts).serve)
+        monitor.start()
+
+        events = {}
+        interval = max(args.interval, 0.1)
+        try:
+            while True:
+                # 与整秒（或整数倍间隔）对齐输出
+                now = time.time()
+                due = now + interval - now % interval
+                time.sleep(due - now)
+                profiling.record("tick_lateness", max(0.0, time.time() - due))
+                start_time = time.perf_counter()
+                try:
+                    while True:
+                        path, event = updates.get_nowait()
+                        events[path] = event
+                except queue.Empty:
+                    pass
+                write_states(accounts, events, args.json)
+                profiling.record("tick_duration", time.perf_counter() - start_time)
+                report_startup()
+        finally:
+            monitor.stop()
+    except KeyboardInterrupt:
+        pass
+    except BrokenPipeError:
+        # 管道另一端已关闭（例如 | head），避免退出时再次写入报错
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
@@ -0,0 +1,303 @@
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime
+
+import profiling
+from log_parser import DEFAULT_SCANNER
+from log_reader import LogTailer, find_latest_rotated_event
+from log_watcher import create_watcher
+
+# 有日志所在的目录暂时无法监视时，每隔多少秒检查一次所有日志
+CHECK_INTERVAL = 5
+
+# 在任务时间之后稍晚一点醒来，保证醒来时已经过了任务时间（秒）
+DEADLINE_MARGIN = 0.05
+
+# 表示日志还没有读取过的占位值
+NOT_READ = object()
+
+
+class LogState:
+    """单个日志文件的读取状态"""
+
+    def __init__(self, path):
+        self.path = path
+        self.tailer = None
+        # 日志中最新的任务事件
+        self.latest_event = None
+        # 当前日志中没有任务事件时，从轮转产生的旧日志中找到的事件
+        self.rotated_event = NOT_READ
+        # 最近一次通知给订阅者的事件
+        self.published_event = NOT_READ
+        # 是否还需要为冷启动之前的日志内容补建任务历史索引
+        self.history_pending = False
+        self.subscribers = []
+
+
+class LogMonitor:
+    """
+    在一个后台线程的 asyncio 事件循环中监视所有账号的日志文件
+    日志的读取、解析和状态只在这个事件循环中处理，同一个日志只读取、解析一次，
+    任务事件变化时把事件（不可变的 ScheduleEvent）通知所有订阅者；
+    本地状态服务等其他服务也可以通过 add_service 运行在同一个事件循环中
+    订阅者的回调在后台线程中调用且持有内部锁，只能做把事件放入队列之类的简单操作
+    """
+
+    def __init__(self, scanner=DEFAULT_SCANNER, state_cache=None, history=None):
+        """
+        state_cache: 可选的 StateCache，用于重启后从上次读取的位置继续
+        history: 可选的 ScheduleHistory，把读取到的每一条任务事件写入历史索引
+        """
+        self.scanner = scanner
+        self.state_cache = state_cache
+        self.history = history
+        self.watcher = create_watcher()
+        self.running = False
+        self.loop = None
+        self._wakeup = None
+        self._services = []
+        self._logs = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def subscribe(self, path, callback):
+        """订阅日志的任务事件，callback(event) 在事件变化时调用"""
+        with self._lock:
+            state = self._logs.get(path)
+            if state is None:
+                state = self._logs[path] = LogState(path)
+            state.subscribers.append(callback)
+            if state.published_event is not NOT_READ:
+                # 日志已经被其他账号读取过，直接发送当前事件
+                callback(state.published_event)
+        self.wake()
+
+    def unsubscribe(self, path, callback):
+        """取消订阅，没有订阅者的日志不再监视"""
+        with self._lock:
+            state = self._logs.get(path)
+            if state is None:
+                return
+            if callback in state.subscribers:
+                state.subscribers.remove(callback)
+            if not state.subscribers:
+                del self._logs[path]
+        self.wake()
+
+    def add_service(self, service):
+        """添加与日志监视运行在同一个事件循环中的服务，service() 返回协程，监视器停止时被取消"""
+        self._services.append(service)
+
+    def wake(self):
+        """从任意线程唤醒事件循环，检查所有日志"""
+        loop = self.loop
+        if loop is None:
+            return
+        try:
+            loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # 事件循环已经结束
+            pass
+
+    def start(self):
+        """启动后台线程"""
+        self.running = True
+        self._thread = threading.Thread(target=profiling.profiled(self.run), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """停止后台线程，等待它保存解析状态后退出"""
+        self.running = False
+        self.wake()
+        if self._thread is not None:
+            self._thread.join(timeout=2)
+
+    def run(self):
+        """后台线程：运行事件循环直到 stop"""
+        asyncio.run(self.main())
+
+    async def main(self):
+        """事件循环主任务：读取发生变化的日志，然后等待下一次变化"""
+        self._wakeup = asyncio.Event()
+        self.loop = asyncio.get_running_loop()
+        services = [asyncio.create_task(service()) for service in self._services]
+        try:
+            changed = None
+            while self.running:
+                with self._lock:
+                    states = list(self._logs.values())
+                paths = {state.path for state in states}
+                if self.watcher.paths != paths or not self.watcher.complete:
+                    self.watcher.set_paths(paths)
+
+                for state in states:
+                    # 到达任务时间或被唤醒时检查所有日志，否则只读取发生变化的日志
+                    if not changed or state.path in changed or state.published_event is NOT_READ:
+                        self.refresh(state)
+                backfilling = self.update_history(states)
+                self.save_state()
+
+                changed = await self.wait_changes(self.next_timeout(states, backfilling))
+        finally:
+            for task in services:
+                task.cancel()
+            await asyncio.gather(*services, return_exceptions=True)
+            self.watcher.close()
+            self.save_state(force=True)
+
+    async def wait_changes(self, timeout):
+        """
+        等待文件变化，最多等待 timeout 秒（None 表示一直等待）
+        返回发生变化的文件集合，超时或被唤醒时返回空集合
+        """
+        if timeout == 0:
+            return set()
+        watch = asyncio.ensure_future(self.watcher.wait_changes())
+        wakeup = asyncio.ensure_future(self._wakeup.wait())
+        done, _ = await asyncio.wait({watch, wakeup}, timeout=timeout,
+                                     return_when=asyncio.FIRST_COMPLETED)
+        for task in (watch, wakeup):
+            task.cancel()
+        # 等待取消完成，监视器移除对文件描述符的监听之后才能再次等待
+        await asyncio.gather(watch, wakeup, return_exceptions=True)
+        if wakeup in done:
+            self._wakeup.clear()
+            return set()
+        if watch in done and watch.exception() is None:
+            return watch.result()
+        return set()
+
+    def next_timeout(self, states, backfilling):
+        """
+        计算这次最多等待多少秒：到最近的任务时间为止，或者到推迟的保存为止；
+        都没有时返回 None，一直等到文件变化或被唤醒
+        """
+        if backfilling:
+            # 还有日志在补建历史索引，不等待，继续读取下一块
+            return 0
+        now = datetime.now()
+        delays = []
+        for state in states:
+            event = state.published_event
+            if event is not NOT_READ and event is not None and event.target_time > now:
+                delays.append((event.target_time - now).total_seconds() + DEADLINE_MARGIN)
+        for store in (self.state_cache, self.history):
+            if store is not None:
+                delay = store.save_delay()
+                if delay is not None:
+                    delays.append(delay)
+        if not self.watcher.complete:
+            delays.append(CHECK_INTERVAL)
+        return min(delays) if delays else None
+
+    def update_history(self, states):
+        """为冷启动时跳过的日志内容补建任务历史索引，每次只读取一块，返回是否还有没有完成的"""
+        if self.history is None:
+            return False
+        backfilling = False
+        for state in states:
+            if state.history_pending:
+                state.history_pending = not self.history.backfill(state.path, self.scanner)
+                backfilling = backfilling or state.history_pending
+        return backfilling
+
+    def save_state(self, force=False):
+        """把各日志的读取位置写入解析状态文件和任务历史索引"""
+        if self.history is not None:
+            self.history.save(force)
+        if self.state_cache is None:
+            return
+        with self._lock:
+            states = list(self._logs.values())
+        for state in states:
+            if state.tailer is not None and state.tailer.inode is not None:
+                self.state_cache.update(state.tailer, state.latest_event)
+        self.state_cache.save(force)
+
+    def refresh(self, state):
+        """读取日志的新内容，任务事件变化时通知订阅者"""
+        event = self.read_log(state)
+        with self._lock:
+            if event == state.published_event:
+                return
+            state.published_event = event
+            for callback in state.subscribers:
+                callback(event)
+
+    def read_log(self, state):
+        """增量读取日志文件并返回日志中最新的任务事件"""
+        if not os.path.exists(state.path):
+            if state.tailer is not None:
+                # 日志刚被轮转走，新的日志还没有创建
+                state.tailer = None
+                state.latest_event = None
+                state.rotated_event = NOT_READ
+            return self.read_rotated_event(state)
+
+        cold_start = False
+        if state.tailer is None:
+            state.tailer = LogTailer(state.path)
+            state.history_pending = self.history is not None
+            restored = False
+            if self.state_cache is not None:
+                # 上次退出时保存的状态仍然有效时，从保存的位置继续增量读取，
+                # 下面接着读取程序关闭期间追加的内容
+                restored, state.latest_event = self.state_cache.restore(state.tailer)
+            if not restored:
+                # 冷启动只需要最新的一条任务事件，从文件末尾向前查找
+                cold_start = True
+                try:
+                    start_time = time.perf_counter()
+                    state.latest_event = state.tailer.find_latest_event(self.scanner)
+                    profiling.record("read_latency", time.perf_counter() - start_time)
+                except Exception:
+                    state.tailer = None
+                    state.latest_event = None
+                    return None
+
+        if not cold_start:
+            start = state.tailer.line_offset
+            previous_offset = state.tailer.offset
+            try:
+                start_time = time.perf_counter()
+                content, rescanned = state.tailer.read_new()
+                read_time = time.perf_counter()
+            except Exception:
+                # 暂时的读取错误（例如轮转恰好发生在检查文件是否存在之后）不清除当前的任务事件，
+                # 下一次日志变化时重新读取
+                if state.latest_event is None:
+                    return self.read_rotated_event(state)
+                return state.latest_event
+
+            if rescanned:
+                # 文件被截断或轮转，之前的结果作废
+                state.latest_event = None
+                state.rotated_event = NOT_READ
+                start = 0
+
+            events = list(self.scanner.scan(content))
+            profiling.record("bytes_read", state.tailer.offset - (0 if rescanned else previous_offset))
+            profiling.record("read_latency", read_time - start_time)
+            profiling.record("parse_time", time.perf_counter() - read_time)
+            profiling.record("matches", len(events))
+            if self.history is not None:
+                self.history.record(state.path, state.tailer.inode, start,
+                                    state.tailer.line_offset, events)
+            if events:
+                # 与冷启动相同，以日志中最新的一条为准，新的安排即使目标时间更早也会替代之前的
+                state.latest_event = events[-1]
+
+        if state.latest_event is None:
+            return self.read_rotated_event(state)
+        return state.latest_event
+
+    def read_rotated_event(self, state):
+        """当前日志中还没有任务事件时（例如刚刚轮转），从轮转产生的旧日志中查找，结果缓存到下一次轮转"""
+        if state.rotated_event is NOT_READ:
+            try:
+                state.rotated_event = find_latest_rotated_event(state.path, self.scanner)
+            except Exception:
+                state.rotated_event = None
+        return state.rotated_event
@@ -0,0 +1,310 @@
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+# 事件来源类型
+EVENT_WAIT_ORDER = "wait_order"  # 等待跑单 XX.X 秒
+EVENT_REST = "rest"              # 休息 ...，到HH:MM:SS开始工作
+
+# 解析出的任务事件：来源类型、日志行时间戳、目标时间
+ScheduleEvent = namedtuple("ScheduleEvent", ["kind", "timestamp", "target_time"])
+
+# 目标时间的计算规则
+TARGET_AFTER = "after"  # 日志时间加上 hours/minutes/seconds 分组表示的时长
+TARGET_AT = "at"        # 日志日期的 hour:minute[:second] 时刻，早于日志时间则为第二天
+
+# 每条日志行开头的时间戳，所有事件格式共用
+TIMESTAMP_PREFIX = r"(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}),\d+ .*?: "
+
+# 默认的事件格式，可以在 config.json 的 event_patterns 中替换：
+#   kind     事件类型（wait_order 或 rest），决定倒计时的显示方式
+#   pattern  时间戳之后的消息正则，用命名分组提取时间
+#   target   目标时间的计算规则（after 或 at）
+#   marker   可选，只有包含该关键字的行才会运行正则，默认取 pattern 开头的固定文字
+DEFAULT_EVENT_PATTERNS = [
+    {
+        # "等待跑单 XX.X 秒"
+        "kind": "wait_order",
+        "pattern": r"等待跑单 (?P<seconds>\d+\.?\d*) 秒",
+        "target": TARGET_AFTER,
+    },
+    {
+        # "休息 X 小时 Y 分钟，到HH:MM:SS开始工作" 或 "休息 X 分钟，到HH:MM:SS开始工作"
+        "kind": "rest",
+        "pattern": r"休息 (?:\d+ 小时 )?\d+ 分钟，到(?P<hour>\d{2}):(?P<minute>\d{2}):(?P<second>\d{2})开始工作",
+        "target": TARGET_AT,
+    },
+]
+
+# 各计算规则使用的分组，以及至少需要其中哪些分组
+TARGET_GROUPS = {
+    TARGET_AFTER: (("hours", "minutes", "seconds"), ("hours", "minutes", "seconds")),
+    TARGET_AT: (("hour", "minute", "second"), ("hour", "minute")),
+}
+
+# 正则中有特殊含义的字符，marker 取到这些字符之前为止
+REGEX_SPECIAL = set(".^$*+?{}[]\\|()")
+
+# 合并时需要处理的正则写法：数字反向引用、转义字符、命名分组及其引用、条件分组、全局内联标志
+PATTERN_TOKEN = re.compile(r"\\(\d+)|\\.|\(\?P([<=])(\w+)|\(\?\((\w+)\)|\(\?[aiLmsux]+\)")
+
+
+def has_top_level_alternation(pattern):
+    """正则是否在最外层使用了 |，这时开头的固定文字只属于第一个分支"""
+    depth = 0
+    in_class = False
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\":
+            i += 1
+        elif in_class:
+            in_class = char != "]"
+        elif char == "[":
+            in_class = True
+            # 字符集开头的 ] 和 ^] 是普通字符
+            if pattern[i + 1:i + 2] == "^":
+                i += 1
+            if pattern[i + 1:i + 2] == "]":
+                i += 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "|" and depth == 0:
+            return True
+        i += 1
+    return False
+
+
+def literal_prefix(pattern):
+    """返回正则开头的固定文字，作为预筛选的关键字；最外层有 | 时返回空字符串"""
+    if has_top_level_alternation(pattern):
+        return ""
+    prefix = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char == "\\" and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            char = pattern[i + 1]
+            i += 1
+        elif char in REGEX_SPECIAL:
+            # 后面跟着量词时前一个字符不一定出现
+            if char in "?*{" and prefix:
+                prefix.pop()
+            break
+        prefix.append(char)
+        i += 1
+    return "".join(prefix)
+
+
+def prefix_group_names(pattern, prefix):
+    """
+    给正则中的命名分组、命名反向引用和条件分组加上前缀，合并后各格式的分组不会重名
+    数字反向引用、数字条件分组合并后会指向别的分组，全局内联标志（例如 (?i)）只能写在整个正则开头，
+    都无法合并，抛出 ValueError
+    """
+    def rewrite(match):
+        digits, kind, name, condition = match.group(1, 2, 3, 4)
+        text = match.group(0)
+        if digits is not None:
+            if digits.startswith("0"):
+                # \0 开头的是八进制转义，不是反向引用
+                return text
+            raise ValueError(f"事件格式 {pattern} 不支持数字反向引用 {text}，请改用 (?P=名称)")
+        if kind is not None:
+            return f"(?P{kind}{prefix}{name}"
+        if condition is not None:
+            if condition.isdigit():
+                raise ValueError(f"事件格式 {pattern} 不支持数字条件分组 {text}，请改用分组名称")
+            return f"(?({prefix}{condition})"
+        if text.startswith("(?"):
+            raise ValueError(f"事件格式 {pattern} 不支持全局内联标志 {text}，请改用 (?i:...) 的形式")
+        return text
+
+    return PATTERN_TOKEN.sub(rewrite, pattern)
+
+
+def compile_event_patterns(patterns):
+    """
+    把事件格式编译为一个合并的正则和预筛选关键字
+    每个格式放在自己的分组 e<序号> 中，其中的命名分组加上 e<序号>_ 前缀，避免不同格式的分组重名
+    返回 (关键字, 合并的正则, 分组名 -> (事件类型, 计算规则, 分组前缀, 使用的分组))
+    格式有误时抛出 ValueError
+    """
+    if not patterns:
+        raise ValueError("至少需要一种事件格式")
+    markers = []
+    alternatives = []
+    rules = {}
+    for index, spec in enumerate(patterns):
+        try:
+            kind, pattern, target = spec["kind"], spec["pattern"], spec["target"]
+        except (KeyError, TypeError):
+            raise ValueError(f"第 {index + 1} 个事件格式缺少 kind、pattern 或 target")
+        if kind not in (EVENT_WAIT_ORDER, EVENT_REST):
+            raise ValueError(f"未知的事件类型: {kind}")
+        if target not in TARGET_GROUPS:
+            raise ValueError(f"未知的目标时间规则: {target}")
+        try:
+            group_names = set(re.compile(pattern).groupindex)
+        except re.error as e:
+            raise ValueError(f"事件格式 {pattern} 不是有效的正则: {e}")
+        names, required = TARGET_GROUPS[target]
+        used = tuple(name for name in names if name in group_names)
+        if not used or (target == TARGET_AT and not set(required) <= group_names):
+            raise ValueError(f"事件格式 {pattern} 缺少 {'、'.join(required)} 分组")
+        marker = spec.get("marker") or literal_prefix(pattern)
+        if not marker:
+            raise ValueError(f"事件格式 {pattern} 开头没有固定文字或最外层使用了 |，需要指定 marker")
+
+        prefix = f"e{index}_"
+        pattern = prefix_group_names(pattern, prefix)
+        alternatives.append(f"(?P<e{index}>{pattern})")
+        rules[f"e{index}"] = (kind, target, prefix, used)
+        markers.append(marker)
+
+    # 包含其他关键字的关键字是多余的，只查找较短的一个
+    markers = [marker for marker in dict.fromkeys(markers)
+               if not any(other != marker and other in marker for other in markers)]
+    try:
+        combined = re.compile(TIMESTAMP_PREFIX + "(?:" + "|".join(alternatives) + ")")
+    except re.error as e:
+        raise ValueError(f"事件格式无法合并为一个正则: {e}")
+    return tuple(markers), combined, rules
+
+
+def parse_timestamp(timestamp_str):
+    """解析定长的 YYYY-MM-DD HH:MM:SS 时间戳，比 strptime 快得多"""
+    return datetime(
+        int(timestamp_str[0:4]), int(timestamp_str[5:7]), int(timestamp_str[8:10]),
+        int(timestamp_str[11:13]), int(timestamp_str[14:16]), int(timestamp_str[17:19])
+    )
+
+
+class EventScanner:
+    """
+    单次扫描日志内容提取任务事件
+    所有事件格式编译为一个正则，先用关键字查找候选行，只对候选行运行一遍正则
+    日志内容可以是 str，也可以是直接从文件读取的 bytes：
+    bytes 用编码后的关键字查找，只解码候选行，其余行不需要解码，无效字节也不会导致整段内容解析失败
+    """
+
+    def __init__(self, patterns=DEFAULT_EVENT_PATTERNS, encoding='utf-8'):
+        self.markers, self.pattern, self.rules = compile_event_patterns(patterns)
+        self.encoding = encoding
+        self.encoded_markers = tuple(marker.encode(encoding) for marker in self.markers)
+
+    def iter_candidate_lines(self, text):
+        """按顺序返回包含任一关键字的行，text 为 bytes 时返回的行也是 bytes"""
+        if isinstance(text, bytes):
+            markers, newline = self.encoded_markers, b"\n"
+        else:
+            markers, newline = self.markers, "\n"
+        # 每个关键字记录下一次出现的位置，保证整段文本对每个关键字只查找一遍
+        next_hits = [text.find(marker) for marker in markers]
+        while True:
+            hits = [hit for hit in next_hits if hit >= 0]
+            if not hits:
+                return
+            hit = min(hits)
+            start = text.rfind(newline, 0, hit) + 1
+            end = text.find(newline, hit)
+            if end < 0:
+                end = len(text)
+            yield text[start:end]
+
+            for i, marker in enumerate(markers):
+                if 0 <= next_hits[i] < end:
+                    next_hits[i] = text.find(marker, end)
+
+    def scan(self, text):
+        """按日志顺序返回所有 ScheduleEvent"""
+        is_bytes = isinstance(text, bytes)
+        for line in self.iter_candidate_lines(text):
+            if is_bytes:
+                # 按换行符切分的行不会截断多字节字符，逐行解码即可；无效字节替换掉，不影响其余内容
+                line = line.decode(self.encoding, errors='replace')
+            for match in self.pattern.finditer(line):
+                event = self.match_to_event(match)
+                if event is not None:
+                    yield event
+
+    def match_to_event(self, match):
+        """将正则匹配结果转换为 ScheduleEvent，时间无效时返回 None"""
+        kind, target, prefix, names = self.rules[match.lastgroup]
+        values = {name: match.group(prefix + name) for name in names}
+        try:
+            timestamp = parse_timestamp(match.group("timestamp"))
+            if target == TARGET_AFTER:
+                # 例如等待跑单：时间戳加上等待的时长
+                duration = timedelta(**{name: float(value) for name, value in values.items()
+                                        if value is not None})
+                return ScheduleEvent(kind, timestamp, timestamp + duration)
+
+            # 例如休息：时间戳的日期加上目标时刻，早于时间戳则为第二天
+            # 没有 second 分组（或分组没有匹配）时为整分，不沿用日志行的秒数
+            target_time = timestamp.replace(hour=int(values["hour"]), minute=int(values["minute"]),
+                                            second=int(values.get("second") or 0), microsecond=0)
+            if target_time < timestamp:
+                target_time += timedelta(days=1)
+            return ScheduleEvent(kind, timestamp, target_time)
+        except (TypeError, ValueError):
+            return None
+
+    def latest(self, text):
+        """返回日志中最后一条事件（最新的安排会替代之前的安排），没有找到时返回 None"""
+        latest_event = None
+        for latest_event in self.scan(text):
+            pass
+        return latest_event
+
+
+DEFAULT_SCANNER = EventScanner()
+
+
+def create_scanner(config):
+    """按配置中的 event_patterns 创建 EventScanner，没有配置或配置有误时使用默认格式"""
+    patterns = config.get("event_patterns")
+    if not patterns:
+        return DEFAULT_SCANNER
+    try:
+        return EventScanner(patterns)
+    except ValueError as e:
+        print(f"事件格式配置有误，使用默认格式: {e}")
+        return DEFAULT_SCANNER
+
+
+def parse_next_mowing_time(log_content):
+    """
+    解析日志内容获取下次任务事件
+    假设日志中有类似格式: "休息 12 分钟，到15:16:53开始工作"
+    或者格式: "休息 1 小时 4 分钟，到16:47:18开始工作"
+    或者格式: "等待跑单 XX.X 秒"
+    返回日志中最后一条 ScheduleEvent，没有找到时返回 None
+    """
+    return DEFAULT_SCANNER.latest(log_content)
+
+
+def format_countdown(event, now=None):
+    """根据任务事件生成倒计时显示文本"""
+    if event is None:
+        return "运行中..."
+
+    now = now or datetime.now()
+    if event.target_time <= now:
+        # 已经过了计划时间，等待日志中出现新的任务时间
+        return "运行中..."
+
+    # 计算剩余时间
+    diff = event.target_time - now
+    if event.kind == EVENT_WAIT_ORDER:
+        # "等待跑单"的倒计时显示剩余秒数
+        return f"跑单中……剩余{int(diff.total_seconds())}秒"
+
+    days = diff.days
+    hours, remainder = divmod(diff.seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    if days > 0:
+        return f"{days}天 {hours:02d}:{minutes:02d}:{seconds:02d}后开始运行"
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}后开始运行"
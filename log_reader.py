@@ -0,0 +1,182 @@
+import gzip
+import hashlib
+import os
+
+# 从文件末尾向前扫描时每次读取的块大小
+REVERSE_CHUNK_SIZE = 64 * 1024
+
+# 用文件开头这么多字节的哈希识别同一个日志文件（inode 可能被复用）
+HEAD_HASH_SIZE = 4096
+
+# 顺序读取压缩日志时每次解压的块大小
+STREAM_CHUNK_SIZE = 1024 * 1024
+
+
+def file_head_hash(path, length=HEAD_HASH_SIZE):
+    """返回文件开头 length 字节的哈希和实际读取的长度"""
+    with open(path, 'rb') as f:
+        data = f.read(length)
+    return hashlib.sha1(data).hexdigest(), len(data)
+
+
+def iter_lines_reversed(f, end, chunk_size=REVERSE_CHUNK_SIZE):
+    """
+    从 end 位置开始向前分块读取，按从后往前的顺序返回每一行（bytes，不含换行符）
+    按 b'\n' 切分，换行符不会出现在UTF-8多字节字符内部，所以块边界不会截断字符；
+    每块开头不完整的行拼接到前一块的末尾
+    第一个返回值是最后一个换行符之后的内容（可能为空或是未写完的行）
+    """
+    pos = end
+    head = b''
+    while pos > 0:
+        read_size = min(chunk_size, pos)
+        pos -= read_size
+        f.seek(pos)
+        lines = (f.read(read_size) + head).split(b'\n')
+        head = lines[0]
+        for line in reversed(lines[1:]):
+            yield line
+    yield head
+
+
+class LogTailer:
+    """
+    增量读取日志文件
+    记录已读取的字节偏移、文件inode和大小，每次只读取新追加的内容；
+    检测到文件被截断或轮转时从头重新扫描；
+    末尾不完整的行保留到下一次读取时再拼接
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.reset()
+
+    def reset(self):
+        """清空读取状态，下次读取时从文件开头扫描"""
+        self.offset = 0
+        self.inode = None
+        self.size = 0
+        self.partial = b''
+
+    @property
+    def line_offset(self):
+        """最后一个完整行之后的位置，从这里恢复读取不会丢失未写完的行"""
+        return self.offset - len(self.partial)
+
+    def resume(self, offset, inode):
+        """从之前保存的位置（必须位于行首）继续增量读取"""
+        self.offset = offset
+        self.inode = inode
+        self.size = offset
+        self.partial = b''
+
+    def read_new(self, max_bytes=None):
+        """
+        读取上次读取之后新追加的完整行，max_bytes 限制本次最多读取的字节数
+        返回 (新内容, 是否从头重新扫描)，新内容为未解码的 bytes，由 EventScanner 只解码需要的行
+        """
+        stat = os.stat(self.path)
+        rescanned = False
+        if self.inode is None or stat.st_ino != self.inode or stat.st_size < self.offset:
+            # 首次读取、文件被轮转或被截断，从头开始
+            self.reset()
+            rescanned = True
+
+        if stat.st_size == self.offset and not rescanned:
+            return b"", False
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read() if max_bytes is None else f.read(max_bytes)
+
+        chunk = self.partial + data
+        # 只处理到最后一个换行符，剩余不完整的行留到下次
+        end = chunk.rfind(b'\n') + 1
+
+        self.partial = chunk[end:]
+        self.offset += len(data)
+        self.inode = stat.st_ino
+        self.size = stat.st_size
+        return chunk[:end], rescanned
+
+    def find_latest_event(self, scanner):
+        """
+        冷启动时从文件末尾向前查找最新的任务事件，找到第一条匹配的行即停止
+        之后的增量读取从当前文件末尾开始
+        """
+        stat = os.stat(self.path)
+        markers = scanner.encoded_markers
+        event = None
+        with open(self.path, 'rb') as f:
+            lines = iter_lines_reversed(f, stat.st_size)
+            # 最后一个换行符之后是未写完的行，留给增量读取拼接
+            partial = next(lines)
+            for line in lines:
+                if not any(marker in line for marker in markers):
+                    continue
+                event = scanner.latest(line)
+                if event is not None:
+                    break
+
+        self.offset = stat.st_size
+        self.inode = stat.st_ino
+        self.size = stat.st_size
+        self.partial = partial
+        return event
+
+
+def find_last_event_in_stream(f, scanner):
+    """
+    顺序分块读取文件流（例如 gzip 解压流），返回最后一条任务事件
+    内存占用只与块大小有关，不会把整个文件读入内存
+    """
+    markers = scanner.encoded_markers
+    last_event = None
+    partial = b''
+    while True:
+        chunk = f.read(STREAM_CHUNK_SIZE)
+        data = partial + chunk
+        if chunk:
+            # 只处理完整的行，剩余部分拼接到下一块
+            end = data.rfind(b'\n') + 1
+            data, partial = data[:end], data[end:]
+        if any(marker in data for marker in markers):
+            for event in scanner.scan(data):
+                last_event = event
+        if not chunk:
+            return last_event
+
+
+def rotated_log_files(path):
+    """
+    返回日志轮转产生的旧文件（runtime.log.1、runtime.log.2024-01-01、runtime.log.2.gz 等），
+    按修改时间从新到旧排列
+    """
+    directory, name = os.path.split(os.path.abspath(path))
+    prefix = name + "."
+    files = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.name.startswith(prefix) and entry.is_file():
+                    files.append((entry.stat().st_mtime, entry.path))
+    except OSError:
+        return []
+    files.sort(reverse=True)
+    return [file_path for _, file_path in files]
+
+
+def find_latest_rotated_event(path, scanner):
+    """
+    依次从新到旧在轮转产生的旧日志中查找最新的任务事件，找到即停止，不会读取更旧的文件
+    普通文件从末尾向前查找，.gz 文件流式解压查找
+    """
+    for rotated_path in rotated_log_files(path):
+        if rotated_path.endswith('.gz'):
+            with gzip.open(rotated_path, 'rb') as f:
+                event = find_last_event_in_stream(f, scanner)
+        else:
+            event = LogTailer(rotated_path).find_latest_event(scanner)
+        if event is not None:
+            return event
+    return None
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import struct
+import sys
+
+# 轮询方式检查文件状态的间隔（秒）
+POLL_INTERVAL = 0.25
+
+# inotify 事件掩码（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_WATCH_MASK = IN_MODIFY | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+_INOTIFY_EVENT = struct.Struct("iIII")
+
+
+class PollingWatcher:
+    """通过 os.stat 轮询文件的 mtime 和大小来检测变化，适用于所有平台"""
+
+    def __init__(self, interval=POLL_INTERVAL):
+        self.interval = interval
+        self.paths = set()
+        # 轮询不依赖目录是否存在，总能发现文件的变化
+        self.complete = True
+        self._signatures = {}
+
+    @staticmethod
+    def _signature(path):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def set_paths(self, paths):
+        """设置需要监视的文件列表"""
+        self.paths = set(paths)
+        self._signatures = {path: self._signature(path) for path in self.paths}
+
+    async def wait_changes(self):
+        """等待文件变化，返回发生变化的文件集合；超时和唤醒由调用方处理"""
+        while True:
+            changed = set()
+            for path in self.paths:
+                signature = self._signature(path)
+                if signature != self._signatures.get(path):
+                    self._signatures[path] = signature
+                    changed.add(path)
+            if changed:
+                return changed
+            await asyncio.sleep(self.interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """
+    使用 Linux inotify 监视日志所在目录，文件被修改、创建或轮转时立即返回
+    监视目录而不是文件本身，这样文件被重新创建后仍然有效
+    """
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self.paths = set()
+        # 是否所有日志所在的目录都已经在监视
+        self.complete = True
+        # 监视描述符 -> 目录，目录 -> 监视描述符
+        self._dirs_by_wd = {}
+        self._watches = {}
+
+    def set_paths(self, paths):
+        """设置需要监视的文件列表，目录不存在而无法监视的，再次调用时重试"""
+        self.paths = set(paths)
+        wanted = {os.path.dirname(os.path.abspath(path)) for path in self.paths}
+
+        for directory in list(self._watches):
+            if directory not in wanted:
+                wd = self._watches.pop(directory)
+                self._dirs_by_wd.pop(wd, None)
+                self._libc.inotify_rm_watch(self._fd, wd)
+
+        for directory in wanted:
+            if directory in self._watches:
+                continue
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory), IN_WATCH_MASK)
+            if wd < 0:
+                # 目录不存在时无法监视，等目录出现后由下一次 set_paths 重试
+                continue
+            self._dirs_by_wd[wd] = directory
+            self._watches[directory] = wd
+        self.complete = len(self._watches) == len(wanted)
+
+    def _path_lookup(self):
+        lookup = {}
+        for path in self.paths:
+            lookup[os.path.abspath(path)] = path
+        return lookup
+
+    async def wait_changes(self):
+        """
+        在事件循环中等待 inotify 事件，返回发生变化的文件集合
+        同一目录中其他文件的变化不会返回；超时和唤醒由调用方处理
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            readable = loop.create_future()
+            loop.add_reader(self._fd, lambda: readable.done() or readable.set_result(None))
+            try:
+                await readable
+            finally:
+                loop.remove_reader(self._fd)
+            changed = self.read_events()
+            if changed:
+                return changed
+
+    def read_events(self):
+        """读取所有已经到达的 inotify 事件，返回其中对应监视文件的集合"""
+        lookup = self._path_lookup()
+        changed = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos < len(data):
+                wd, _, _, length = _INOTIFY_EVENT.unpack_from(data, pos)
+                pos += _INOTIFY_EVENT.size
+                name = os.fsdecode(data[pos:pos + length].rstrip(b"\0"))
+                pos += length
+                directory = self._dirs_by_wd.get(wd)
+                if directory is None:
+                    continue
+                path = lookup.get(os.path.join(directory, name))
+                if path is not None:
+                    changed.add(path)
+        return changed
+
+    def close(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+def create_watcher():
+    """创建文件监视器，支持 inotify 时优先使用，否则退回到 stat 轮询"""
+    if sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+    return PollingWatcher()
@@ -0,0 +1,143 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import deque
+
+# 每项数值保留最近多少次用于滚动统计
+WINDOW = 100
+
+# 定期输出统计行的间隔（秒）
+LOG_INTERVAL = 60
+
+# 结束时输出耗时最多的函数个数
+TOP_FUNCTIONS = 20
+
+# Python 3.12 起 cProfile 通过 sys.monitoring 分析整个解释器的所有线程，同时只能开启一个，
+# 主线程的分析器已经包括后台线程，不需要（也不能）再为每个线程创建分析器
+PER_THREAD_PROFILERS = sys.version_info < (3, 12)
+
+# 统计项名称、显示名称、单位（秒为单位的数值按毫秒显示）
+METRICS = [
+    ("bytes_read", "读取字节", "KB"),
+    ("read_latency", "读取耗时", "ms"),
+    ("parse_time", "解析耗时", "ms"),
+    ("matches", "每次匹配", ""),
+    ("tick_duration", "刷新耗时", "ms"),
+    ("tick_lateness", "刷新延迟", "ms"),
+]
+
+enabled = False
+_values = {}
+_totals = {}
+_lock = threading.Lock()
+_main_profiler = None
+_thread_profilers = []
+
+
+def enable():
+    """开启统计和 cProfile，只统计开启之后的部分"""
+    global enabled, _main_profiler
+    enabled = True
+    _main_profiler = cProfile.Profile()
+    _main_profiler.enable()
+
+
+def record(name, value):
+    """记录一次数值，例如读取的字节数或耗时（秒）"""
+    if not enabled:
+        return
+    with _lock:
+        if name not in _values:
+            _values[name] = deque(maxlen=WINDOW)
+            _totals[name] = [0, 0]
+        _values[name].append(value)
+        totals = _totals[name]
+        totals[0] += 1
+        totals[1] += value
+
+
+def profiled(func):
+    """包装后台线程的入口函数，开启统计时该线程也由 cProfile 分析"""
+    def run(*args, **kwargs):
+        if not enabled or not PER_THREAD_PROFILERS:
+            return func(*args, **kwargs)
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except Exception as e:
+            # 无法开启分析时照常运行，只是这个线程不统计
+            print(f"无法分析后台线程: {e}")
+            return func(*args, **kwargs)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with _lock:
+                _thread_profilers.append(profiler)
+    return run
+
+
+def format_stats():
+    """生成一行滚动统计：最近 WINDOW 次的平均值和最大值，以及开启以来的次数"""
+    parts = []
+    with _lock:
+        for name, title, unit in METRICS:
+            values = _values.get(name)
+            if not values:
+                continue
+            scale = {"KB": 1 / 1024, "ms": 1000}.get(unit, 1)
+            average = sum(values) / len(values) * scale
+            maximum = max(values) * scale
+            parts.append(f"{title} 平均{average:.2f}{unit} 最大{maximum:.2f}{unit} ({_totals[name][0]}次)")
+    return " | ".join(parts) or "暂无统计数据"
+
+
+def output(text, config_dir):
+    """有控制台时输出到标准错误，打包的窗口程序写入配置文件目录下的 profile.log"""
+    if sys.stderr is not None:
+        print(text, file=sys.stderr)
+        return
+    try:
+        with open(os.path.join(config_dir, "profile.log"), 'a', encoding='utf-8') as f:
+            f.write(text + "\n")
+    except OSError:
+        pass
+
+
+def start_log(config_dir="."):
+    """每隔 LOG_INTERVAL 秒输出一行滚动统计"""
+    def run():
+        while True:
+            time.sleep(LOG_INTERVAL)
+            output(time.strftime("[%H:%M:%S] ") + format_stats(), config_dir)
+
+    if enabled:
+        threading.Thread(target=run, daemon=True).start()
+
+
+def dump(config_dir="."):
+    """
+    结束 cProfile，合并所有线程的结果保存到配置文件目录下的 profile.prof，
+    并输出最后的统计行和累计耗时最多的函数
+    """
+    if not enabled or _main_profiler is None:
+        return
+    _main_profiler.disable()
+    stats = pstats.Stats(_main_profiler)
+    with _lock:
+        for profiler in _thread_profilers:
+            stats.add(profiler)
+    path = os.path.join(config_dir, "profile.prof")
+    try:
+        stats.dump_stats(path)
+    except OSError as e:
+        print(f"保存性能分析结果出错: {e}")
+
+    stream = io.StringIO()
+    stats.stream = stream
+    stats.sort_stats("cumulative").print_stats(TOP_FUNCTIONS)
+    output(f"{format_stats()}\n性能分析结果已保存到 {path}\n{stream.getvalue()}", config_dir)
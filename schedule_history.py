@@ -0,0 +1,260 @@
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from log_parser import EVENT_REST, EVENT_WAIT_ORDER, ScheduleEvent
+from log_reader import STREAM_CHUNK_SIZE, LogTailer
+from state_cache import SAVE_INTERVAL
+
+# 保存在配置文件旁边的任务历史索引文件名
+HISTORY_FILE = "history.db"
+
+# 补建索引时每次最多读取的字节数，读取大日志时不会长时间占用后台线程
+BACKFILL_CHUNK_SIZE = 8 * STREAM_CHUNK_SIZE
+
+# 事件类型在数据库中保存为整数
+KIND_CODES = {EVENT_REST: 0, EVENT_WAIT_ORDER: 1}
+CODE_KINDS = {code: kind for kind, code in KIND_CODES.items()}
+
+# 休息的目标时间是日志日期上的时刻（早于日志时间则为第二天），最长不超过一天（秒）
+MAX_REST_SECONDS = 24 * 3600
+
+# 时间保存为距这个时刻的秒数（日志时间没有时区，不做时区换算）
+EPOCH = datetime(1970, 1, 1)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    inode INTEGER,
+    offset INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS events (
+    source_id INTEGER NOT NULL,
+    timestamp INTEGER NOT NULL,
+    kind INTEGER NOT NULL,
+    target_time REAL NOT NULL,
+    PRIMARY KEY (source_id, timestamp, kind, target_time)
+) WITHOUT ROWID;
+"""
+
+
+def to_seconds(value):
+    return (value - EPOCH).total_seconds()
+
+
+def from_seconds(seconds):
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class ScheduleHistory:
+    """
+    把日志中的每一条任务事件保存到本地 SQLite 索引中，随增量读取不断补充
+    同时记录每个日志已索引到的位置，重启后只需要补充读取之后的内容；
+    重复写入的事件会被忽略，所以同一段日志被读取多次也不会产生重复记录
+    统计查询直接从索引中得到，不需要重新解析日志
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        # 日志路径 -> [source_id, inode, offset]
+        self.sources = None
+        self.dirty = False
+        self.last_save = 0.0
+        self._backfill_tailers = {}
+
+    def connection(self):
+        """每个线程使用自己的数据库连接"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def load_sources(self):
+        if self.sources is None:
+            rows = self.connection().execute("SELECT path, id, inode, offset FROM sources")
+            self.sources = {path: [source_id, inode, offset] for path, source_id, inode, offset in rows}
+        return self.sources
+
+    def source_id(self, path):
+        """返回日志对应的 source_id，没有时创建"""
+        key = os.path.abspath(path)
+        sources = self.load_sources()
+        if key not in sources:
+            conn = self.connection()
+            cursor = conn.execute("INSERT INTO sources (path) VALUES (?)", (key,))
+            conn.commit()
+            sources[key] = [cursor.lastrowid, None, 0]
+        return sources[key][0]
+
+    def record(self, path, inode, start, end, events):
+        """
+        记录从日志 start 位置读取到 end 位置得到的事件
+        只有这段内容与已索引的部分相连时才推进已索引的位置，否则留给 backfill 补充
+        """
+        try:
+            source_id = self.source_id(path)
+            rows = [(source_id, int(to_seconds(event.timestamp)), KIND_CODES[event.kind],
+                     to_seconds(event.target_time)) for event in events]
+            if rows:
+                conn = self.connection()
+                conn.executemany("INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?)", rows)
+                conn.commit()
+        except sqlite3.Error as e:
+            print(f"写入任务历史出错: {e}")
+            return
+
+        source = self.sources[os.path.abspath(path)]
+        if start == 0:
+            # 新文件或从头重新扫描
+            source[1], source[2] = inode, end
+            self.dirty = True
+        elif source[1] == inode and start <= source[2] < end:
+            source[2] = end
+            self.dirty = True
+
+    def backfill(self, path, scanner, max_bytes=BACKFILL_CHUNK_SIZE):
+        """
+        从已索引的位置继续读取日志，补充还没有索引的事件，每次最多读取 max_bytes 字节
+        返回是否已经读到文件末尾
+        """
+        key = os.path.abspath(path)
+        tailer = self._backfill_tailers.get(key)
+        if tailer is None:
+            tailer = self._backfill_tailers[key] = LogTailer(path)
+            try:
+                _, inode, offset = self.load_sources().get(key, (None, None, 0))
+                stat = os.stat(path)
+            except (OSError, sqlite3.Error):
+                del self._backfill_tailers[key]
+                return True
+            if inode == stat.st_ino and offset <= stat.st_size:
+                tailer.resume(offset, inode)
+
+        try:
+            start = tailer.line_offset
+            content, rescanned = tailer.read_new(max_bytes)
+        except OSError:
+            del self._backfill_tailers[key]
+            return True
+        self.record(path, tailer.inode, 0 if rescanned else start, tailer.line_offset,
+                    scanner.scan(content))
+
+        if tailer.offset >= tailer.size:
+            del self._backfill_tailers[key]
+            return True
+        return False
+
+    def save_delay(self):
+        """距离下一次可以写入还有多少秒，没有需要写入的内容时返回 None"""
+        if not self.dirty:
+            return None
+        return max(0.0, SAVE_INTERVAL - (time.monotonic() - self.last_save))
+
+    def save(self, force=False):
+        """把各日志已索引到的位置写入数据库"""
+        if not self.dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_save < SAVE_INTERVAL:
+            return
+        # 写入失败时也要等 SAVE_INTERVAL 秒再重试
+        self.last_save = now
+        try:
+            conn = self.connection()
+            conn.executemany("UPDATE sources SET inode = ?, offset = ? WHERE id = ?",
+                             [(inode, offset, source_id)
+                              for source_id, inode, offset in self.sources.values()])
+            conn.commit()
+        except sqlite3.Error as e:
+            print(f"保存任务历史出错: {e}")
+            return
+        self.dirty = False
+
+    def query(self, sql, params, log_path, suffix="", suffix_params=()):
+        """在 sql 的条件后加上日志路径的限制，再加上 suffix（ORDER BY、LIMIT 等）并执行查询"""
+        if log_path is not None:
+            sql += " AND source_id = (SELECT id FROM sources WHERE path = ?)"
+            params = params + (os.path.abspath(log_path),)
+        return self.connection().execute(sql + suffix, params + suffix_params)
+
+    def events_between(self, start, end, log_path=None):
+        """返回日志时间在 [start, end) 之间的事件，按时间顺序排列"""
+        rows = self.query("SELECT timestamp, kind, target_time FROM events "
+                          "WHERE timestamp >= ? AND timestamp < ?",
+                          (to_seconds(start), to_seconds(end)), log_path)
+        events = [ScheduleEvent(CODE_KINDS[kind], from_seconds(timestamp), from_seconds(target_time))
+                  for timestamp, kind, target_time in rows]
+        events.sort(key=lambda event: event.timestamp)
+        return events
+
+    def rest_durations(self, count, log_path=None):
+        """
+        返回最近 count 次休息的 (开始时间, 时长)，从新到旧排列
+        与倒计时一致，日志中之后出现的新安排替代这次休息，休息只持续到新安排出现
+        """
+        # 按主键 (source_id, timestamp, ...) 倒序读取，读到 count 条即停止；
+        # 同一日志中的下一条事件也按主键查找
+        rows = self.query("SELECT timestamp, MIN(target_time, COALESCE("
+                          "(SELECT MIN(later.timestamp) FROM events AS later "
+                          "WHERE later.source_id = events.source_id AND later.timestamp > events.timestamp), "
+                          "target_time)) FROM events WHERE kind = ?",
+                          (KIND_CODES[EVENT_REST],), log_path,
+                          " ORDER BY timestamp DESC LIMIT ?", (count,))
+        return [(from_seconds(timestamp), timedelta(seconds=target_time - timestamp))
+                for timestamp, target_time in rows]
+
+    def working_share(self, day, log_path=None, now=None):
+        """
+        返回 day 这一天（今天则到 now 为止）中不在休息的时间所占的比例
+        这一天没有任何记录时返回 None
+        """
+        day_start = datetime.combine(day, datetime.min.time())
+        day_end = min(day_start + timedelta(days=1), now or datetime.now())
+        if day_end <= day_start:
+            return None
+        start, end = to_seconds(day_start), to_seconds(day_end)
+
+        # 这一天内的所有事件，以及前一天开始、可能持续到这一天的事件（休息最长不超过 MAX_REST_SECONDS）
+        rows = self.query("SELECT source_id, timestamp, kind, target_time FROM events "
+                          "WHERE timestamp >= ? AND timestamp < ?",
+                          (start - MAX_REST_SECONDS, end), log_path,
+                          " ORDER BY source_id, timestamp").fetchall()
+
+        # 从后向前遍历，记录同一日志中下一条（时间更晚的）事件的时间；
+        # 与倒计时一致，新安排出现后之前的休息即结束
+        rests = []
+        has_record = False
+        next_source, next_time, following = None, None, None
+        for source_id, timestamp, kind, target_time in reversed(rows):
+            if source_id != next_source:
+                next_source, next_time, following = source_id, None, None
+            elif timestamp < next_time:
+                following = next_time
+            next_time = timestamp
+            if kind == KIND_CODES[EVENT_REST] and following is not None:
+                target_time = min(target_time, following)
+            if timestamp >= start or (kind == KIND_CODES[EVENT_REST] and target_time > start):
+                has_record = True
+                if kind == KIND_CODES[EVENT_REST]:
+                    rests.append((timestamp, target_time))
+        if not has_record:
+            return None
+        rests.sort()
+
+        # 合并重叠的休息时间段
+        resting = 0.0
+        covered_until = start
+        for rest_start, rest_end in rests:
+            rest_start = max(rest_start, covered_until)
+            rest_end = min(rest_end, end)
+            if rest_end > rest_start:
+                resting += rest_end - rest_start
+                covered_until = rest_end
+        return 1 - resting / (end - start)
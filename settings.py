@@ -1,47 +1,23 @@
-import tkinter as tk
-from tkinter import ttk, colorchooser, font
-import json
 import os
-import sys
+import tkinter as tk
+from tkinter import ttk, font
 
-def get_config_path():
-    """获取配置文件路径"""
-    try:
-        # PyInstaller环境下
-        base_path = sys._MEIPASS
-        # 在打包环境中，配置文件应该在可执行文件同级目录
-        config_path = os.path.join(os.path.dirname(sys.executable), "config.json")
-        if os.path.exists(config_path):
-            return config_path
-    except Exception:
-        pass
-    
-    # 开发环境或配置文件在当前目录
-    return "config.json"
+from config_store import ConfigStore, get_config_dir
+from font_list import DEFAULT_FONTS, FONT_CACHE_FILE, FontList
 
-# 默认配置
-DEFAULT_CONFIG = {
-    "log_file_path": r".\runtime.log",
-    "font_name": "Microsoft YaHei",
-    "font_size": 24,
-    "background_color": "#80ff80",
-    "font_color": "#000000",
-    "remark_font_size": 20,
-    "remark_color": "#0000ff",
-    "window_width": 550,
-    "window_height": 60,
-    "window_x": 1000,
-    "window_y": 1000,
-    "window_alpha": 1.0,
-    "remark": "账号1"
-}
+# 不实时预览、只在点击"应用"或"保存设置"时修改的配置项：
+# 日志路径每输入一个字符都会重新订阅日志，窗口位置和大小在设置窗口打开期间可能被拖动改变
+NO_PREVIEW_KEYS = {"log_file_path", "window_width", "window_height", "window_x", "window_y"}
 
 
 class SettingsWindow:
     def __init__(self, parent=None):
         """初始化设置窗口"""
         self.parent = parent
-        self.config = self.load_config()
+        # 由主窗口打开时使用主窗口共用的内存配置和对应的账号
+        self.store = getattr(parent, 'store', None) or ConfigStore()
+        self.account_index = getattr(parent, 'account_index', None)
+        self.config = self.store.get(self.account_index)
         
         # 创建主窗口
         self.window = tk.Toplevel()
@@ -72,6 +48,23 @@ class SettingsWindow:
         self.create_widgets()
         self.load_settings_to_form()
         
+        # 系统字体列表由主窗口在启动后加载，独立运行时自己加载
+        self.font_list = getattr(parent, 'font_list', None)
+        if self.font_list is None:
+            self.font_list = FontList(self.window, os.path.join(get_config_dir(), FONT_CACHE_FILE))
+            self.font_list.start()
+        self.font_list.subscribe(self.set_font_names)
+        # 表单最后一次从配置加载（或应用）时的值，应用时只写入之后修改过的配置项
+        self.loaded = self.form_values()
+        # 预览过、还没有应用的配置项，关闭窗口时只撤销这些配置项
+        self.previewed = set()
+        # 从配置刷新表单时不触发预览
+        self.loading = False
+        # 表单变化时实时预览发生变化的配置项
+        self.var_keys = {str(var): key for key, var in self.form_vars.items()}
+        for var in self.form_vars.values():
+            var.trace_add('write', self.on_setting_change)
+        
     def scale_fonts(self, scale_factor):
         """根据缩放因子调整字体大小"""
         if scale_factor != 1.0:
@@ -125,25 +118,6 @@ class SettingsWindow:
         y = (self.window.winfo_screenheight() // 2) - (height // 2)
         self.window.geometry(f'{width}x{height}+{x}+{y}')
 
-    def load_config(self):
-        """加载配置文件"""
-        config_file = get_config_path()
-        if os.path.exists(config_file):
-            try:
-                with open(config_file, 'r', encoding='utf-8') as f:
-                    return {**DEFAULT_CONFIG, **json.load(f)}
-            except Exception:
-                return DEFAULT_CONFIG.copy()
-        else:
-            self.save_config(DEFAULT_CONFIG)
-            return DEFAULT_CONFIG.copy()
-
-    def save_config(self, config):
-        """保存配置到文件"""
-        config_file = get_config_path()
-        with open(config_file, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=4, ensure_ascii=False)
-
     def create_widgets(self):
         """创建设置界面控件"""
         # 创建主框架
@@ -163,9 +137,10 @@ class SettingsWindow:
         # 字体设置
         ttk.Label(main_frame, text="字体:", font=label_font).grid(row=1, column=0, sticky=tk.W, pady=5)
         self.font_name_var = tk.StringVar()
-        font_names = ["Microsoft YaHei", "SimSun", "SimHei", "KaiTi", "FangSong"]
-        font_name_combo = ttk.Combobox(main_frame, textvariable=self.font_name_var, values=font_names, state="readonly", width=15, font=entry_font)
-        font_name_combo.grid(row=1, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=5)
+        # 可以输入文字筛选，展开下拉列表时只列出名称包含输入文字的字体
+        self.font_names = list(DEFAULT_FONTS)
+        self.font_name_combo = ttk.Combobox(main_frame, textvariable=self.font_name_var, values=self.font_names, postcommand=self.filter_font_names, width=15, font=entry_font)
+        self.font_name_combo.grid(row=1, column=1, columnspan=2, sticky=(tk.W, tk.E), pady=5)
         
         # 字体大小设置
         ttk.Label(main_frame, text="字体大小:", font=label_font).grid(row=2, column=0, sticky=tk.W, pady=5)
@@ -270,6 +245,23 @@ class SettingsWindow:
         main_frame.columnconfigure(1, weight=1)
         self.window.columnconfigure(0, weight=1)
         self.window.rowconfigure(0, weight=1)
+        
+        # 配置项和表单变量的对应关系
+        self.form_vars = {
+            "log_file_path": self.log_file_var,
+            "font_name": self.font_name_var,
+            "font_size": self.font_size_var,
+            "background_color": self.bg_color_var,
+            "font_color": self.font_color_var,
+            "remark_font_size": self.remark_font_size_var,
+            "remark_color": self.remark_color_var,
+            "window_width": self.width_var,
+            "window_height": self.height_var,
+            "window_x": self.x_var,
+            "window_y": self.y_var,
+            "window_alpha": self.window_alpha_var,
+            "remark": self.remark_var
+        }
 
     def load_settings_to_form(self):
         """将配置加载到表单"""
@@ -291,6 +283,23 @@ class SettingsWindow:
         self.update_color_previews()
         self.window_alpha_label.config(text=f"{self.window_alpha_var.get():.1f}")
 
+    def set_font_names(self, families):
+        """系统字体列表加载完成后替换下拉框中的字体"""
+        self.font_names = families
+        try:
+            self.font_name_combo['values'] = families
+        except tk.TclError:
+            # 设置窗口已关闭
+            pass
+
+    def filter_font_names(self):
+        """展开下拉列表前按输入的文字筛选字体，输入的是完整的字体名称时列出全部字体"""
+        text = self.font_name_var.get().strip().lower()
+        names = self.font_names
+        if text and self.font_name_var.get() not in names:
+            names = [name for name in names if text in name.lower()]
+        self.font_name_combo['values'] = names
+
     def update_color_previews(self):
         """更新颜色预览"""
         bg_color = self.bg_color_var.get()
@@ -313,6 +322,7 @@ class SettingsWindow:
 
     def choose_bg_color(self):
         """选择背景颜色"""
+        from tkinter import colorchooser
         color = colorchooser.askcolor(title="选择背景颜色", color=self.bg_color_var.get())
         if color[1]:  # 用户选择了颜色而不是取消
             self.bg_color_var.set(color[1])
@@ -320,6 +330,7 @@ class SettingsWindow:
 
     def choose_font_color(self):
         """选择字体颜色"""
+        from tkinter import colorchooser
         color = colorchooser.askcolor(title="选择字体颜色", color=self.font_color_var.get())
         if color[1]:  # 用户选择了颜色而不是取消
             self.font_color_var.set(color[1])
@@ -327,6 +338,7 @@ class SettingsWindow:
 
     def choose_remark_color(self):
         """选择备注颜色"""
+        from tkinter import colorchooser
         color = colorchooser.askcolor(title="选择备注颜色", color=self.remark_color_var.get())
         if color[1]:  # 用户选择了颜色而不是取消
             self.remark_color_var.set(color[1])
@@ -334,32 +346,63 @@ class SettingsWindow:
 
     def on_alpha_change(self, value):
         """窗口透明度变化时的回调函数"""
-        # 更新透明度标签显示
+        # 更新透明度标签显示，预览由变量的 trace 处理
         alpha_value = float(value)
         self.window_alpha_label.config(text=f"{alpha_value:.1f}")
-        
-        # 如果有父窗口，实时预览透明度变化
-        if hasattr(self.parent, 'root'):
+
+    def form_values(self):
+        """读取表单中的设置，正在输入、暂时无效的数值不包括在内"""
+        values = {}
+        for key, var in self.form_vars.items():
             try:
-                self.parent.root.attributes('-alpha', alpha_value)
+                values[key] = var.get()
             except tk.TclError:
                 pass
+        # 正在输入筛选文字时不把它当作字体名称
+        if values.get("font_name") not in self.font_names and values.get("font_name") != self.config.get("font_name"):
+            values.pop("font_name", None)
+        return values
 
-    def on_setting_change(self, *args):
-        """设置发生变化时的回调函数"""
-        # 实时预览颜色和字体变化
-        if hasattr(self.parent, 'reload_config'):
-            self.parent.reload_config()
-
-    def on_window_geometry_change(self, *args):
-        """窗口几何属性变化时的回调函数"""
-        # 实时预览窗口大小和位置变化
-        if hasattr(self.parent, 'root'):
+    def show(self):
+        """再次打开已经创建的窗口：按内存中的当前配置刷新表单后显示"""
+        # 窗口正显示时只提到最前，保留正在预览、还没有应用的修改
+        if self.window.state() == 'withdrawn':
+            self.config = self.store.get(self.account_index)
+            self.loading = True
             try:
-                self.parent.root.geometry(f"{self.width_var.get()}x{self.height_var.get()}+"
-                                        f"{self.x_var.get()}+{self.y_var.get()}")
-            except tk.TclError:
-                pass
+                self.load_settings_to_form()
+            finally:
+                self.loading = False
+            self.loaded = self.form_values()
+            self.previewed = set()
+        self.window.deiconify()
+        self.window.lift()
+        self.window.focus_force()
+
+    def hide(self):
+        """由主窗口打开时只隐藏窗口，下次打开时直接显示；独立运行时销毁窗口"""
+        try:
+            if self.parent is None:
+                self.window.destroy()
+            else:
+                self.window.withdraw()
+        except tk.TclError:
+            pass
+
+    def on_setting_change(self, name, *args):
+        """设置发生变化时的回调函数，name 为发生变化的表单变量"""
+        if self.loading:
+            return
+        key = self.var_keys.get(name)
+        if key is None or key in NO_PREVIEW_KEYS:
+            return
+        value = self.form_values().get(key)
+        if value is None:
+            # 正在输入、暂时无效的值不预览
+            return
+        self.previewed.add(key)
+        # 只修改内存中的这一项配置用于预览，主窗口合并到下一帧只更新受影响的控件
+        self.store.update({key: value}, self.account_index, persist=False)
 
     def close_window(self):
         """处理窗口销毁"""
@@ -373,89 +416,32 @@ class SettingsWindow:
                 pass
 
     def close_settings(self):
-        """关闭设置窗口时重新加载主窗口配置"""
-        try:
-            if hasattr(self.parent, 'reload_config'):
-                self.parent.reload_config()
-        except:
-            pass
-            
-        # 正确关闭窗口
-        try:
-            self.window.destroy()
-        except:
-            pass
+        """关闭设置窗口时撤销没有应用的预览，其他配置项（例如拖动后的窗口位置）保持不变"""
+        self.store.discard_preview(self.previewed, self.account_index)
+        self.previewed = set()
+        if self.parent is None:
+            self.store.flush()
+        self.hide()
 
     def save_settings(self):
         """保存设置到配置文件"""
         self.apply_settings()
-        # 正确关闭窗口
-        try:
-            self.window.destroy()
-        except:
-            pass
+        if self.parent is None:
+            self.store.flush()
+        self.hide()
 
     def apply_settings(self):
         """应用设置"""
-        new_config = {
-            "log_file_path": self.log_file_var.get(),
-            "font_name": self.font_name_var.get(),
-            "font_size": self.font_size_var.get(),
-            "background_color": self.bg_color_var.get(),
-            "font_color": self.font_color_var.get(),
-            "remark_font_size": self.remark_font_size_var.get(),
-            "remark_color": self.remark_color_var.get(),
-            "window_width": self.width_var.get(),
-            "window_height": self.height_var.get(),
-            "window_x": self.x_var.get(),
-            "window_y": self.y_var.get(),
-            "window_alpha": self.window_alpha_var.get(),
-            "remark": self.remark_var.get()
-        }
-        
-        self.save_config(new_config)
-        self.config = new_config
-        
-        # 如果有父窗口，通知它重新加载配置
-        if hasattr(self.parent, 'reload_config'):
-            self.parent.reload_config()
-            
-        # 实时预览各种设置变化
-        if hasattr(self.parent, 'root'):
-            try:
-                root = self.parent.root
-                
-                # 实时预览透明度变化
-                root.attributes('-alpha', new_config['window_alpha'])
-                
-                # 实时预览窗口大小和位置变化
-                root.geometry(f"{new_config['window_width']}x{new_config['window_height']}+"
-                             f"{new_config['window_x']}+{new_config['window_y']}")
-                
-                # 实时预览背景颜色和字体颜色变化
-                root.configure(bg=new_config['background_color'])
-                
-                # 假设主窗口有一个 text_label 用于显示文本
-                if hasattr(self.parent, 'countdown_label') and self.parent.countdown_label:
-                    font_spec = (new_config['font_name'], new_config['font_size'], 'bold')
-                    self.parent.countdown_label.configure(
-                        fg=new_config['font_color'],
-                        bg=new_config['background_color'],
-                        font=font_spec
-                    )
-                
-                # 假设主窗口有一个 remark_label 用于显示备注
-                if hasattr(self.parent, 'remark_label') and self.parent.remark_label:
-                    remark_font_spec = (new_config['font_name'], new_config['remark_font_size'], 'bold')
-                    self.parent.remark_label.configure(
-                        fg=new_config['remark_color'],
-                        bg=new_config['background_color'],
-                        font=remark_font_spec,
-                        text=new_config['remark']
-                    )
-                    
-            except (tk.TclError, AttributeError) as e:
-                print(f"实时预览设置时出错: {e}")
+        values = self.form_values()
+        # 只写入在表单中修改过的配置项，设置窗口打开期间拖动改变的窗口位置不会被表单中的旧值覆盖
+        # 写入内存配置，主窗口收到变化通知后更新界面，写入文件会推迟合并
+        changed = {key: value for key, value in values.items() if value != self.loaded.get(key)}
+        self.store.update(changed, self.account_index)
+        # 修改后又改回原值的配置项没有写入，撤销它们剩下的预览
+        self.store.discard_preview(self.previewed - set(changed), self.account_index)
+        self.config = self.store.get(self.account_index)
+        self.loaded = values
+        self.previewed = set()
 
     def setup_styles(self):
         """设置界面样式"""
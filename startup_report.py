@@ -0,0 +1,52 @@
+import os
+import sys
+import time
+
+# 程序入口导入本模块的时间，作为所有阶段的起点
+START_TIME = time.perf_counter()
+
+enabled = False
+_marks = []
+_written = False
+
+
+def enable():
+    """开启启动耗时记录"""
+    global enabled
+    enabled = True
+
+
+def mark(name):
+    """记录一个启动阶段完成的时间，同名阶段只记录第一次"""
+    if enabled and all(existing != name for existing, _ in _marks):
+        _marks.append((name, time.perf_counter()))
+
+
+def format_report():
+    """生成启动耗时报告：每个阶段距程序开始的时间和与上一阶段的间隔"""
+    lines = ["启动耗时报告（毫秒）:"]
+    previous = START_TIME
+    for name, timestamp in _marks:
+        lines.append(f"  {name:<16}{(timestamp - START_TIME) * 1000:>9.1f}  (+{(timestamp - previous) * 1000:.1f})")
+        previous = timestamp
+    return "\n".join(lines)
+
+
+def write_report(config_dir="."):
+    """
+    输出启动耗时报告
+    有控制台时输出到标准错误，打包的窗口程序没有控制台，写入配置文件目录下的 startup_report.txt
+    """
+    global _written
+    if not enabled or _written:
+        return
+    _written = True
+    report = format_report()
+    if sys.stderr is not None:
+        print(report, file=sys.stderr)
+        return
+    try:
+        with open(os.path.join(config_dir, "startup_report.txt"), 'a', encoding='utf-8') as f:
+            f.write(report + "\n")
+    except OSError:
+        pass
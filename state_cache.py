@@ -0,0 +1,126 @@
+import json
+import os
+import time
+from datetime import datetime
+
+from log_parser import ScheduleEvent
+from log_reader import HEAD_HASH_SIZE, file_head_hash
+
+# 保存在配置文件旁边的解析状态文件名
+STATE_CACHE_FILE = "parse_state.json"
+
+# 两次写入状态文件的最短间隔（秒），退出时总是写入
+SAVE_INTERVAL = 10
+
+
+def event_to_dict(event):
+    if event is None:
+        return None
+    return {
+        "kind": event.kind,
+        "timestamp": event.timestamp.isoformat(),
+        "target_time": event.target_time.isoformat(),
+    }
+
+
+def event_from_dict(data):
+    if data is None:
+        return None
+    return ScheduleEvent(data["kind"],
+                         datetime.fromisoformat(data["timestamp"]),
+                         datetime.fromisoformat(data["target_time"]))
+
+
+class StateCache:
+    """
+    持久化每个日志的读取状态：文件标识（路径、inode、大小、开头内容的哈希）、
+    已读取到的位置和最后解析出的任务事件
+    重启后校验通过即可从保存的位置继续增量读取，不需要重新扫描日志
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        self.last_save = 0.0
+        self.load()
+
+    def load(self):
+        """读取状态文件，文件不存在或损坏时忽略"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.entries = json.load(f).get("logs", {})
+        except (OSError, ValueError, AttributeError):
+            self.entries = {}
+
+    def restore(self, tailer):
+        """
+        校验保存的状态是否仍然对应同一个文件，有效时让 tailer 从保存的位置继续读取
+        返回 (是否恢复成功, 保存的任务事件)
+        """
+        entry = self.entries.get(os.path.abspath(tailer.path))
+        if entry is None:
+            return False, None
+        try:
+            stat = os.stat(tailer.path)
+            if stat.st_ino != entry["inode"] or stat.st_size < entry["offset"]:
+                return False, None
+            head_hash, _ = file_head_hash(tailer.path, entry["head_length"])
+            if head_hash != entry["head_hash"]:
+                return False, None
+            event = event_from_dict(entry["event"])
+        except (OSError, KeyError, TypeError, ValueError):
+            return False, None
+
+        tailer.resume(entry["offset"], entry["inode"])
+        return True, event
+
+    def update(self, tailer, event):
+        """记录 tailer 当前的读取位置和最新事件"""
+        key = os.path.abspath(tailer.path)
+        entry = self.entries.get(key)
+        offset = tailer.line_offset
+        if entry and entry.get("inode") == tailer.inode and entry.get("offset") == offset:
+            return
+        try:
+            # 只在文件变化（新文件或开头不足 HEAD_HASH_SIZE）时重新计算开头的哈希
+            if entry and entry.get("inode") == tailer.inode and entry.get("head_length", 0) >= HEAD_HASH_SIZE:
+                head_hash, head_length = entry["head_hash"], entry["head_length"]
+            else:
+                head_hash, head_length = file_head_hash(tailer.path)
+        except OSError:
+            return
+        self.entries[key] = {
+            "inode": tailer.inode,
+            "size": tailer.size,
+            "head_hash": head_hash,
+            "head_length": head_length,
+            "offset": offset,
+            "event": event_to_dict(event),
+        }
+        self.dirty = True
+
+    def save_delay(self):
+        """距离下一次可以写入还有多少秒，没有需要写入的内容时返回 None"""
+        if not self.dirty:
+            return None
+        return max(0.0, SAVE_INTERVAL - (time.monotonic() - self.last_save))
+
+    def save(self, force=False):
+        """有变化时写入状态文件，先写临时文件再替换，避免写到一半时崩溃损坏文件"""
+        if not self.dirty:
+            return
+        now = time.monotonic()
+        if not force and now - self.last_save < SAVE_INTERVAL:
+            return
+        # 写入失败时也要等 SAVE_INTERVAL 秒再重试
+        self.last_save = now
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump({"logs": self.entries}, f, indent=4, ensure_ascii=False)
+            os.replace(temp_path, self.path)
+        except OSError as e:
+            print(f"保存解析状态出错: {e}")
+            return
+        self.dirty = False
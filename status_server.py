@@ -0,0 +1,139 @@
+import asyncio
+import json
+from datetime import datetime
+
+from headless import account_state
+
+# 只监听本机
+STATUS_HOST = "127.0.0.1"
+
+# 事件流在没有变化时每隔多少秒发送一次注释行，避免连接被中间代理断开
+KEEPALIVE_INTERVAL = 15
+
+
+class StatusServer:
+    """
+    本地 HTTP 服务，提供当前倒计时状态
+        GET /status  当前所有账号的状态（JSON）
+        GET /events  状态变化时推送的事件流（Server-Sent Events）
+    通过 LogMonitor.add_service(server.serve) 与日志监视运行在同一个事件循环中，
+    状态来自日志监视器的通知，响应请求不会读取日志，客户端再多也没有额外开销
+    默认不允许跨域访问，避免浏览器中打开的任意网页读取状态（其中包括本地日志路径）；
+    只有来源在 allowed_origins 中的网页可以读取
+    """
+
+    def __init__(self, monitor, accounts, port, host=STATUS_HOST, allowed_origins=()):
+        self.monitor = monitor
+        self.accounts = accounts
+        self.host = host
+        self.port = port
+        self.allowed_origins = set(allowed_origins or ())
+        self.events = {}
+        self.version = 0
+        self._changed = None
+        self._stopped = None
+
+    async def serve(self):
+        """运行服务直到被取消"""
+        self._changed = asyncio.Event()
+        self._stopped = asyncio.Event()
+        try:
+            server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        except OSError as e:
+            print(f"启动状态服务出错: {e}")
+            return
+
+        # 回调由日志监视器在同一个事件循环中调用，可以直接更新状态
+        callbacks = {path: (lambda event, path=path: self.update(path, event))
+                     for path in {account['log_file_path'] for account in self.accounts}}
+        for path, callback in callbacks.items():
+            self.monitor.subscribe(path, callback)
+        try:
+            async with server:
+                try:
+                    await self._stopped.wait()
+                finally:
+                    self.shutdown()
+        finally:
+            for path, callback in callbacks.items():
+                self.monitor.unsubscribe(path, callback)
+
+    def shutdown(self):
+        """结束服务，同时唤醒所有事件流让它们退出"""
+        self._stopped.set()
+        self._changed.set()
+
+    def update(self, path, event):
+        """记录新的任务事件并唤醒所有等待中的事件流"""
+        self.events[path] = event
+        self.version += 1
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def status(self):
+        """生成当前状态，剩余秒数按请求时的时间计算"""
+        now = datetime.now()
+        return {
+            "version": self.version,
+            "accounts": [account_state(account, self.events.get(account['log_file_path']), now)
+                         for account in self.accounts],
+        }
+
+    async def handle_client(self, reader, writer):
+        try:
+            request_line = await reader.readline()
+            # 请求头中只需要 Origin
+            origin = None
+            while True:
+                header = (await reader.readline()).decode('latin-1').strip()
+                if not header:
+                    break
+                name, _, value = header.partition(':')
+                if name.strip().lower() == "origin":
+                    origin = value.strip()
+            cors = ""
+            if origin in self.allowed_origins:
+                cors = f"Access-Control-Allow-Origin: {origin}\r\nVary: Origin\r\n"
+            parts = request_line.decode('latin-1').split()
+            path = parts[1].split('?')[0] if len(parts) >= 2 else ''
+            if len(parts) < 2 or parts[0] != "GET":
+                await self.send_response(writer, "405 Method Not Allowed", {"error": "method not allowed"}, cors)
+            elif path == "/status":
+                await self.send_response(writer, "200 OK", self.status(), cors)
+            elif path == "/events":
+                await self.send_events(writer, cors)
+            else:
+                await self.send_response(writer, "404 Not Found", {"error": "not found"}, cors)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def send_response(self, writer, status, data, cors=""):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        writer.write(f"HTTP/1.1 {status}\r\n"
+                     "Content-Type: application/json; charset=utf-8\r\n"
+                     f"Content-Length: {len(body)}\r\n"
+                     f"{cors}"
+                     "Connection: close\r\n\r\n".encode('latin-1') + body)
+        await writer.drain()
+
+    async def send_events(self, writer, cors=""):
+        """先发送当前状态，之后每次状态变化时推送一次"""
+        writer.write("HTTP/1.1 200 OK\r\n"
+                     "Content-Type: text/event-stream; charset=utf-8\r\n"
+                     "Cache-Control: no-cache\r\n"
+                     f"{cors}"
+                     "Connection: keep-alive\r\n\r\n".encode('latin-1'))
+        while not self._stopped.is_set():
+            status = self.status()
+            writer.write(f"id: {status['version']}\ndata: {json.dumps(status, ensure_ascii=False)}\n\n"
+                         .encode('utf-8'))
+            await writer.drain()
+            changed = self._changed
+            while not changed.is_set() and not self._stopped.is_set():
+                try:
+                    await asyncio.wait_for(changed.wait(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")
+                    await writer.drain()
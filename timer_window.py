@@ -0,0 +1,470 @@
+import tkinter as tk
+import importlib.util
+import os
+import queue
+import time
+import sys
+
+import profiling
+import startup_report
+from config_store import ConfigStore, get_accounts, get_config_dir
+from font_list import FONT_CACHE_FILE, FontList
+from log_monitor import LogMonitor
+from state_cache import STATE_CACHE_FILE, StateCache
+from schedule_history import HISTORY_FILE, ScheduleHistory
+from log_parser import create_scanner, format_countdown
+
+# 添加当前目录到sys.path以便导入settings模块
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+# settings 模块（以及其中的 ttk、colorchooser）只在第一次打开设置窗口时才导入
+SETTINGS_AVAILABLE = importlib.util.find_spec("settings") is not None
+
+# 配置变化后合并到下一帧再更新界面（毫秒）
+FRAME_INTERVAL = 16
+
+# 启动后等待多少毫秒再加载系统字体列表（毫秒）
+FONT_LIST_DELAY = 1000
+
+# 各控件受影响的配置项
+GEOMETRY_KEYS = {"window_width", "window_height", "window_x", "window_y"}
+COUNTDOWN_KEYS = {"font_name", "font_size", "font_color"}
+REMARK_KEYS = {"font_name", "remark_font_size", "remark_color", "remark"}
+
+# Windows 上的 Tk 不产生 Visibility 事件，覆盖重定向的悬浮窗一般也不会得到或失去焦点，
+# 无法知道窗口何时被遮挡，只能和以前一样每秒恢复一次置顶；其他平台只在收到事件后恢复
+VISIBILITY_EVENTS = sys.platform != "win32"
+
+
+def setup_dpi_awareness():
+    """开启高DPI感知，需要在创建窗口之前调用"""
+    if sys.platform == "win32":
+        from ctypes import windll
+
+        windll.shcore.SetProcessDpiAwareness(1)
+
+
+class MowerTimerApp:
+    def __init__(self, root, monitor, store, account_index=None, font_list=None):
+        """
+        root: 显示倒计时的窗口（第一个账号使用Tk根窗口，其余账号使用Toplevel）
+        monitor: 所有账号共用的日志监视器
+        store: 所有账号共用的内存配置
+        account_index: 对应 config.json 中 accounts 列表的下标，没有配置多账号时为 None
+        font_list: 所有账号共用的系统字体列表，供设置窗口使用
+        """
+        self.root = root
+        self.font_list = font_list
+        self.root.title("mower定时器")
+        self.monitor = monitor
+        self.store = store
+        self.account_index = account_index
+        
+        # 设置窗口无边框
+        self.root.overrideredirect(True)
+        
+        # 加载配置，配置变化时只更新受影响的控件
+        self.config = self.load_config()
+        self.pending_keys = set()
+        self.apply_scheduled = False
+        self.store.subscribe(self.on_config_change)
+        
+        # 设置初始窗口大小和位置
+        self.root.geometry(f"{self.config['window_width']}x{self.config['window_height']}+"
+                          f"{self.config['window_x']}+{self.config['window_y']}")
+        
+        # 设置窗口透明度和置顶
+        self.root.attributes('-alpha', self.config['window_alpha'])
+        self.root.attributes('-topmost', True)
+        
+        # 当前倒计时对应的任务事件（ScheduleEvent），只在主线程中读写
+        self.next_event = None
+        # 后台线程通过队列把新的任务事件发送给主线程
+        self.state_queue = queue.Queue()
+        # 当前订阅的日志文件
+        self.log_file_path = None
+        
+        # 创建主框架
+        self.main_frame = tk.Frame(self.root, bg=self.config['background_color'])
+        self.main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        # 整个内容区域使用grid布局以便更好地控制元素位置
+        self.content_frame = tk.Frame(self.main_frame, bg=self.config['background_color'])
+        self.content_frame.pack(fill=tk.BOTH, expand=True)
+        self.content_frame.columnconfigure(0, weight=1)  # 左侧倒计时区域
+        self.content_frame.columnconfigure(1, weight=0)  # 右侧按钮区域
+        self.content_frame.rowconfigure(0, weight=1)     # 垂直居中
+        
+        # 左侧倒计时标签
+        self.countdown_label = tk.Label(
+            self.content_frame,
+            text="正在加载...",
+            bg=self.config['background_color'],
+            fg=self.config['font_color'],
+            font=(self.config['font_name'], self.config['font_size'], 'bold')
+        )
+        self.countdown_label.grid(row=0, column=0, sticky='w', padx=10, pady=10)
+        
+        # 右侧按钮框架
+        self.button_frame = tk.Frame(self.content_frame, bg=self.config['background_color'])
+        self.button_frame.grid(row=0, column=1, sticky='', padx=5, pady=5)
+        
+        # 备注标签
+        self.remark_label = tk.Label(
+            self.button_frame,
+            text=self.config['remark'],
+            bg=self.config['background_color'],
+            fg=self.config['remark_color'],
+            font=(self.config['font_name'], self.config['remark_font_size'], 'bold')
+        )
+        self.remark_label.pack(side=tk.LEFT, padx=2)
+        
+        # 设置按钮
+        if SETTINGS_AVAILABLE:
+            self.settings_button = tk.Button(
+                self.button_frame,
+                text='⚙',
+                bg='#3333ff',
+                fg='white',
+                font=('Arial', max(self.config['font_size'] - 6, 2), 'bold'),
+                bd=0,
+                command=self.open_settings,
+                width=3,
+                height=1
+            )
+            self.settings_button.pack(side=tk.LEFT, padx=2)
+        
+        # 关闭按钮
+        self.close_button = tk.Button(
+            self.button_frame,
+            text='×',
+            bg='#ff3333',
+            fg='white',
+            font=('Arial', max(self.config['font_size'] - 6, 2), 'bold'),
+            bd=0,
+            command=self.root.quit,
+            width=3,
+            height=1
+        )
+        self.close_button.pack(side=tk.LEFT, padx=2)
+        
+        # 绑定事件：允许拖动窗口
+        # 绑定在窗口上的事件对窗口内所有控件都生效，每个事件只处理一次；按钮不作为拖动区域
+        self.root.bind('<Button-1>', self.start_move)
+        self.root.bind('<B1-Motion>', self.do_move)
+        self.root.bind('<ButtonRelease-1>', self.end_move)
+        
+        # 初始化移动变量：鼠标相对窗口左上角的位置、是否正在拖动、等待在下一帧移动到的位置
+        self.x = 0
+        self.y = 0
+        self.dragging = False
+        self.drag_position = None
+        self.move_scheduled = False
+        
+        # 只在窗口被完全遮挡或重新显示时恢复置顶，不再每秒调用 lift
+        # 事件只做标记，在下一次刷新时最多恢复一次，避免与其他置顶窗口来回抢占
+        self.raise_pending = False
+        self.root.bind('<Visibility>', self.on_visibility)
+        self.root.bind('<Map>', self.on_visibility)
+        self.root.bind('<FocusOut>', self.on_visibility)
+        
+        # 最近一次显示的倒计时文本，文本不变时不重新设置标签
+        self.rendered_text = None
+        
+        # 设置窗口在第一次打开时创建，之后关闭只是隐藏
+        self.settings_window = None
+        
+        # 订阅日志文件，由共用的日志监视器在后台线程中读取
+        # 首次读取完成前保持显示"正在加载..."
+        self.running = True
+        self.state_received = False
+        self.watch_log_file()
+        
+        # 在主线程的事件循环中每秒刷新倒计时
+        self.wait_first_state()
+        self.schedule_tick()
+
+    @property
+    def next_mowing_time(self):
+        """下次任务时间"""
+        return self.next_event.target_time if self.next_event else None
+
+    def schedule_tick(self):
+        """安排在下一个整秒时刷新界面，每次都按系统时间对齐，误差不会累积"""
+        now = time.time()
+        delay_ms = 1000 - int(now * 1000) % 1000
+        # 计划执行的时间，用于统计刷新延迟
+        self.tick_due = now + delay_ms / 1000
+        self.root.after(delay_ms, self.on_tick)
+
+    def on_tick(self):
+        """每秒在主线程中执行：处理后台线程发来的状态并刷新倒计时"""
+        if not self.running:
+            return
+        profiling.record("tick_lateness", max(0.0, time.time() - self.tick_due))
+        start_time = time.perf_counter()
+        self.process_state_queue()
+        self.update_countdown_display()
+        self.restore_topmost()
+        profiling.record("tick_duration", time.perf_counter() - start_time)
+        self.schedule_tick()
+
+    def process_state_queue(self):
+        """取出队列中所有的状态更新，只保留最新的一个"""
+        try:
+            while True:
+                self.next_event = self.state_queue.get_nowait()
+                self.state_received = True
+        except queue.Empty:
+            pass
+
+    def wait_first_state(self):
+        """日志首次读取完成前每50毫秒检查一次，读取完成后立即显示倒计时，不用等到下一个整秒"""
+        if not self.running:
+            return
+        self.process_state_queue()
+        if not self.state_received:
+            self.root.after(50, self.wait_first_state)
+            return
+        
+        self.update_countdown_display()
+        startup_report.mark("首次显示倒计时")
+        startup_report.write_report(get_config_dir())
+
+    def watch_log_file(self):
+        """订阅配置中的日志文件，路径变化时切换订阅"""
+        log_file_path = self.config['log_file_path']
+        if log_file_path == self.log_file_path:
+            return
+        if self.log_file_path is not None:
+            self.monitor.unsubscribe(self.log_file_path, self.state_queue.put)
+            # 清除旧日志的任务时间
+            self.state_queue.put(None)
+        self.log_file_path = log_file_path
+        self.monitor.subscribe(log_file_path, self.state_queue.put)
+
+    def start_move(self, event):
+        """记录开始移动时鼠标相对窗口左上角的位置，在按钮上按下时不拖动窗口"""
+        self.dragging = not isinstance(event.widget, tk.Button)
+        self.x = event.x_root - self.root.winfo_x()
+        self.y = event.y_root - self.root.winfo_y()
+        self.drag_position = None
+
+    def do_move(self, event):
+        """记录窗口要移动到的位置，同一帧内的多次鼠标移动只移动一次窗口"""
+        if not self.dragging:
+            return
+        self.drag_position = (event.x_root - self.x, event.y_root - self.y)
+        if not self.move_scheduled:
+            self.move_scheduled = True
+            self.root.after(FRAME_INTERVAL, self.apply_move)
+
+    def apply_move(self):
+        """把窗口移动到最新的拖动位置"""
+        self.move_scheduled = False
+        if self.drag_position is None:
+            return
+        x, y = self.drag_position
+        try:
+            self.root.geometry(f"+{x}+{y}")
+        except tk.TclError:
+            pass
+
+    def end_move(self, event):
+        """拖动结束时移动到最终位置，并把位置保存到当前账号的配置中"""
+        self.dragging = False
+        if self.drag_position is None:
+            return
+        self.apply_move()
+        x, y = self.drag_position
+        self.drag_position = None
+        # 先更新自己的配置，收到变化通知时不会再移动一次窗口
+        self.config['window_x'] = x
+        self.config['window_y'] = y
+        self.store.update({'window_x': x, 'window_y': y}, self.account_index)
+
+    def load_config(self):
+        """加载当前账号的配置"""
+        return self.store.get(self.account_index)
+
+    def on_config_change(self, account_index, keys):
+        """配置变化时记录实际变化的配置项，合并到下一帧再更新界面"""
+        if account_index is not None and account_index != self.account_index:
+            return
+        config = self.load_config()
+        # 共用配置可能被账号覆盖，窗口位置也可能随共用配置变化，按合并后的结果比较
+        changed = {key for key, value in config.items() if self.config.get(key) != value}
+        self.config = config
+        if not changed:
+            return
+        self.pending_keys |= changed
+        if not self.apply_scheduled:
+            self.apply_scheduled = True
+            self.root.after(FRAME_INTERVAL, self.apply_config_changes)
+
+    def apply_config_changes(self):
+        """只更新受变化的配置项影响的控件"""
+        keys, self.pending_keys = self.pending_keys, set()
+        self.apply_scheduled = False
+        config = self.config
+        try:
+            if keys & GEOMETRY_KEYS:
+                self.root.geometry(f"{config['window_width']}x{config['window_height']}+"
+                                   f"{config['window_x']}+{config['window_y']}")
+            if 'window_alpha' in keys:
+                self.root.attributes('-alpha', config['window_alpha'])
+            if 'background_color' in keys:
+                for widget in (self.main_frame, self.content_frame, self.button_frame,
+                               self.countdown_label, self.remark_label):
+                    widget.config(bg=config['background_color'])
+            if keys & COUNTDOWN_KEYS:
+                self.countdown_label.config(
+                    fg=config['font_color'],
+                    font=(config['font_name'], config['font_size'], 'bold')
+                )
+            if keys & REMARK_KEYS:
+                self.remark_label.config(
+                    text=config['remark'],
+                    fg=config['remark_color'],
+                    font=(config['font_name'], config['remark_font_size'], 'bold')
+                )
+        except tk.TclError:
+            # 窗口已关闭，或者预览中输入了无效的颜色
+            pass
+        
+        if 'log_file_path' in keys:
+            self.watch_log_file()
+
+    def open_settings(self):
+        """打开设置窗口"""
+        if not SETTINGS_AVAILABLE:
+            return
+        if self.settings_window is None or not self.settings_window.window.winfo_exists():
+            import settings
+            # 不使用模态窗口以支持实时预览
+            self.settings_window = settings.SettingsWindow(self)
+        else:
+            # 再次打开时不重新创建控件，从内存配置刷新表单后直接显示
+            self.settings_window.show()
+
+    def update_countdown_display(self):
+        """更新倒计时显示，文本没有变化时不做任何界面操作"""
+        if not self.state_received:
+            return
+        display_text = format_countdown(self.next_event)
+        if display_text == self.rendered_text:
+            return
+        
+        try:
+            self.countdown_label.config(text=display_text)
+            self.rendered_text = display_text
+        except tk.TclError:
+            # 窗口已关闭
+            pass
+
+    def on_visibility(self, event):
+        """窗口被其他窗口完全遮挡、重新映射或失去焦点时，在下一次刷新时恢复置顶"""
+        # 绑定在窗口上的事件也会由子控件触发，只处理窗口本身的
+        if event.widget is not self.root:
+            return
+        if event.type == tk.EventType.Visibility and event.state != 'VisibilityFullyObscured':
+            return
+        self.raise_pending = True
+
+    def restore_topmost(self):
+        """每次刷新最多恢复一次置顶，被本程序自己的窗口挡住时不恢复"""
+        if VISIBILITY_EVENTS and not self.raise_pending:
+            return
+        self.raise_pending = False
+        if self.covered_by_own_window():
+            return
+        try:
+            self.root.attributes('-topmost', True)
+            self.root.lift()
+        except tk.TclError:
+            pass
+
+    def covered_by_own_window(self):
+        """是否被本程序的其他窗口（其他账号的悬浮窗、设置窗口）挡住，这时恢复置顶只会互相抢占"""
+        try:
+            names = self.root.tk.splitlist(self.root.tk.call('wm', 'stackorder', '.'))
+            own = str(self.root)
+            if own not in names:
+                return False
+            x, y = self.root.winfo_rootx(), self.root.winfo_rooty()
+            width, height = self.root.winfo_width(), self.root.winfo_height()
+            for name in names[names.index(own) + 1:]:
+                other = self.root.nametowidget(name)
+                other_x, other_y = other.winfo_rootx(), other.winfo_rooty()
+                if (other_x < x + width and x < other_x + other.winfo_width()
+                        and other_y < y + height and y < other_y + other.winfo_height()):
+                    return True
+        except (tk.TclError, KeyError):
+            pass
+        return False
+
+    def quit_app(self):
+        """退出应用程序"""
+        self.running = False
+        self.store.unsubscribe(self.on_config_change)
+        self.root.quit()
+
+
+def run():
+    """以悬浮窗模式运行"""
+    setup_dpi_awareness()
+    root = tk.Tk()
+    
+    store = ConfigStore()
+    config = store.get()
+    
+    # 所有账号共用一个日志监视器和一个后台线程，事件格式在启动时按配置编译一次
+    # 解析状态保存在配置文件旁边，重启后不需要重新扫描日志
+    monitor = LogMonitor(create_scanner(config),
+                         state_cache=StateCache(os.path.join(get_config_dir(), STATE_CACHE_FILE)),
+                         history=ScheduleHistory(os.path.join(get_config_dir(), HISTORY_FILE)))
+    
+    # 每个账号一个悬浮窗，第一个账号使用根窗口，所有窗口共用一份内存配置
+    font_list = FontList(root, os.path.join(get_config_dir(), FONT_CACHE_FILE)) if SETTINGS_AVAILABLE else None
+    account_count = len(config.get('accounts') or [])
+    if account_count:
+        apps = [MowerTimerApp(root if index == 0 else tk.Toplevel(root), monitor, store, index, font_list)
+                for index in range(account_count)]
+    else:
+        apps = [MowerTimerApp(root, monitor, store, font_list=font_list)]
+    startup_report.mark("创建窗口")
+    
+    if config.get('status_port'):
+        # 给其他工具提供倒计时状态的本地服务，状态来自同一个日志监视器
+        from status_server import StatusServer
+        monitor.add_service(StatusServer(monitor, get_accounts(config), config['status_port'],
+                                         allowed_origins=config.get('status_allowed_origins')).serve)
+    
+    accounts = get_accounts(config)
+    if any(account.get('notifications') for account in accounts):
+        # 任务开始前的提醒在日志监视的事件循环中按时触发，不占用界面线程
+        from event_bus import EventBus
+        monitor.add_service(EventBus(monitor, accounts).serve)
+    
+    def start_monitor():
+        # 窗口显示出来之后再开始读取日志，首次读取不阻塞首次绘制
+        startup_report.mark("首次绘制")
+        monitor.start()
+        if font_list is not None:
+            # 稍后再加载字体列表，打开设置窗口时不需要等待
+            root.after(FONT_LIST_DELAY, font_list.start)
+    
+    root.after_idle(start_monitor)
+    
+    def quit_all():
+        for app in apps:
+            app.quit_app()
+    
+    # 处理关闭事件
+    root.protocol("WM_DELETE_WINDOW", quit_all)
+    
+    # 启动GUI主循环
+    root.mainloop()
+    # 写入还没有保存的配置修改
+    store.flush()
+    monitor.stop()